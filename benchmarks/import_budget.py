@@ -0,0 +1,129 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+from dataclasses import dataclass
+
+from run_benchmarks import (
+    DATA_GENERATORS_DIR,
+    ETL_DIR
+)
+
+NR_OF_RUNS = 10
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)$")
+GENERATOR_HEAVY_MODULES = ("faker", "fastavro", "pyarrow", "zstandard", "pandas")
+
+
+@dataclass
+class EntryPoint:
+    module: str
+    directory: str
+    budget_in_ms: float
+    forbidden_modules: tuple[str, ...]
+
+
+ENTRY_POINTS = {
+    entry_point.module: entry_point
+    for entry_point in (
+        EntryPoint(
+            "dates_and_customers_generator",
+            DATA_GENERATORS_DIR,
+            200,
+            GENERATOR_HEAVY_MODULES,
+        ),
+        EntryPoint("loans", DATA_GENERATORS_DIR, 200, GENERATOR_HEAVY_MODULES),
+        EntryPoint("monthly_spend", DATA_GENERATORS_DIR, 200, GENERATOR_HEAVY_MODULES),
+        EntryPoint("scoring", ETL_DIR, 150, ("apache_beam", "pandas", "pyarrow")),
+    )
+}
+
+
+def measure_import(entry_point: EntryPoint) -> tuple[float, set[str]]:
+    env = {
+        name: value
+        for name, value in os.environ.items()
+        if name != "PYTHONDONTWRITEBYTECODE"
+    }
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {entry_point.module}"],
+        cwd=entry_point.directory,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    import_time_in_ms = None
+    imported_modules = set()
+    for line in completed.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match is None:
+            continue
+        cumulative_in_us, indent, module = match.groups()
+        imported_modules.add(module)
+        if not indent and module == entry_point.module:
+            import_time_in_ms = int(cumulative_in_us) / 1000
+    return import_time_in_ms, imported_modules
+
+
+def is_forbidden(module: str, forbidden_modules: tuple[str, ...]) -> bool:
+    return any(
+        module == forbidden or module.startswith(f"{forbidden}.")
+        for forbidden in forbidden_modules
+    )
+
+
+def check_import_budget(entry_point: EntryPoint, nr_of_runs: int) -> bool:
+    _, imported_modules = measure_import(entry_point)
+    import_time_in_ms = min(measure_import(entry_point)[0] for _ in range(nr_of_runs))
+    forbidden_modules = sorted(
+        {
+            module.split(".")[0]
+            for module in imported_modules
+            if is_forbidden(module, entry_point.forbidden_modules)
+        }
+    )
+    within_budget = import_time_in_ms <= entry_point.budget_in_ms
+    print(
+        f"{entry_point.module:<32} {import_time_in_ms:8.1f} ms"
+        f"  (budget {entry_point.budget_in_ms:.0f} ms)"
+        f"  {'ok' if within_budget and not forbidden_modules else 'FAILED'}"
+    )
+    if forbidden_modules:
+        print(f"    imports {', '.join(forbidden_modules)}")
+    return within_budget and not forbidden_modules
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--entry-points",
+        type=str,
+        nargs="+",
+        default=list(ENTRY_POINTS),
+        choices=list(ENTRY_POINTS),
+        help="Entry points to check (default: all)",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=NR_OF_RUNS,
+        help="Nr of measured imports per entry point, the fastest is compared",
+    )
+    parser.add_argument(
+        "--budget-factor",
+        type=float,
+        default=1.0,
+        help="Multiplier for all budgets on slower machines",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    results = []
+    for name in args.entry_points:
+        entry_point = ENTRY_POINTS[name]
+        entry_point.budget_in_ms *= args.budget_factor
+        results.append(check_import_budget(entry_point, args.runs))
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,87 @@
+import argparse
+import dataclasses
+import json
+import os
+import resource
+import subprocess
+import sys
+
+DATA_GENERATORS_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "data_generators"
+)
+NR_OF_LOANS = 10_000_000
+NR_OF_DATES = 120
+RECORD_TYPES = ("slots", "dict")
+
+
+def get_peak_rss_in_bytes() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure_loans_memory(nr_of_loans: int, record_type: str) -> dict[str, int]:
+    sys.path.insert(0, DATA_GENERATORS_DIR)
+    import loans
+
+    if record_type == "dict":
+        loans.Loan = dataclasses.make_dataclass(
+            "Loan",
+            [(field.name, field.type) for field in dataclasses.fields(loans.Loan)],
+        )
+    dates = [
+        (f"01-{month % 12 + 1:02d}-{2000 + month // 12}",)
+        for month in range(NR_OF_DATES)
+    ]
+    base_customers_info = (
+        (f"{customer_nr:010d}", "First", "Last") for customer_nr in range(nr_of_loans)
+    )
+
+    rss_before = get_peak_rss_in_bytes()
+    held_loans = loans.extend_loans_info(base_customers_info, dates)
+    peak_rss = get_peak_rss_in_bytes()
+    return {
+        "nr_of_loans": len(held_loans),
+        "peak_rss_in_bytes": peak_rss,
+        "bytes_per_loan": (peak_rss - rss_before) // len(held_loans),
+    }
+
+
+def run_in_subprocess(nr_of_loans: int, record_type: str) -> dict[str, int]:
+    output = subprocess.run(
+        [
+            sys.executable,
+            __file__,
+            "--nr-of-loans",
+            str(nr_of_loans),
+            "--record-type",
+            record_type,
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nr-of-loans", type=int, default=NR_OF_LOANS)
+    parser.add_argument(
+        "--record-type",
+        type=str,
+        default=None,
+        choices=RECORD_TYPES,
+        help="Measure only one record type in this process",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    if args.record_type:
+        print(json.dumps(measure_loans_memory(args.nr_of_loans, args.record_type)))
+    else:
+        results = {
+            record_type: run_in_subprocess(args.nr_of_loans, record_type)
+            for record_type in RECORD_TYPES
+        }
+        print(json.dumps(results, indent=2))
@@ -0,0 +1,457 @@
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import (
+    Any,
+    Callable,
+    Optional
+)
+
+from loans_memory import (
+    DATA_GENERATORS_DIR,
+    get_peak_rss_in_bytes
+)
+
+ETL_DIR = os.path.join(os.path.dirname(DATA_GENERATORS_DIR), "etl")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+SCALES = (1_000, 100_000, 1_000_000)
+NR_OF_YEARS = 1
+SEED = 0
+
+BenchmarkResult = dict[str, Any]
+
+
+def timed(function: Callable, *args: Any) -> tuple[Any, float]:
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def get_file_sizes(filenames: list[str]) -> int:
+    return sum(os.path.getsize(filename) for filename in filenames)
+
+
+def count_csv_rows(filenames: list[str]) -> int:
+    nr_of_rows = 0
+    for filename in filenames:
+        with open(filename, "rb") as file:
+            nr_of_rows += sum(
+                block.count(b"\n") for block in iter(lambda: file.read(1 << 20), b"")
+            )
+    return nr_of_rows
+
+
+def get_output_dir(workdir: str) -> str:
+    return os.path.join(workdir, "data_generators", "output")
+
+
+def read_inputs(workdir: str) -> tuple[list[tuple[str, ...]], list[tuple[str]]]:
+    from utils import (
+        Reader,
+        iter_customers
+    )
+
+    reader = Reader()
+    output_dir = get_output_dir(workdir)
+    customers = list(
+        iter_customers(reader.read_customers(os.path.join(output_dir, "customers.npy")))
+    )
+    return customers, reader.read_dates(os.path.join(output_dir, "dates.npy"))
+
+
+def build_loans(workdir: str) -> tuple[list[Any], list[tuple[str]]]:
+    import loans
+
+    customers, dates = read_inputs(workdir)
+    random.seed(SEED)
+    return loans.extend_loans_info(customers, dates), dates
+
+
+def prepare_inputs(workdir: str, nr_of_customers: int, nr_of_years: int) -> None:
+    import numpy as np
+
+    import loans
+    import monthly_spend
+    from utils import (
+        Writer,
+        customers_to_array,
+        dates_to_array,
+        from_month_ordinal
+    )
+
+    output_dir = get_output_dir(workdir)
+    os.makedirs(output_dir)
+    customers = [
+        (
+            f"{customer_nr:010d}",
+            f"First{customer_nr % 1000}",
+            f"Last{customer_nr % 997}",
+        )
+        for customer_nr in range(nr_of_customers)
+    ]
+    first_month = (datetime.date.today().year - nr_of_years) * 12
+    dates = [
+        from_month_ordinal(first_month + month) for month in range(nr_of_years * 12)
+    ]
+    np.save(os.path.join(output_dir, "customers.npy"), customers_to_array(customers))
+    np.save(os.path.join(output_dir, "dates.npy"), dates_to_array(dates))
+
+    random.seed(SEED)
+    dates = [(date,) for date in dates]
+    for module, elements in (
+        (loans, loans.extend_loans_info(customers, dates)),
+        (monthly_spend, monthly_spend.extend_base_customers_info(customers)),
+    ):
+        out_filename = os.path.join(
+            output_dir, os.path.basename(module.OUTPUT_FILE_NAME)
+        )
+        writer = Writer(
+            out_filename, module.columnar_data_generator, elements, dates, SEED, True
+        )
+        filenames = writer.generate_data_as_temp_files()
+        writer.merge_temp_files_as_csv(module.HEADERS, filenames)
+        writer.delete_temp_files(filenames)
+
+
+def benchmark_generate_base_customers_data(
+    workdir: str, nr_of_customers: int
+) -> BenchmarkResult:
+    import dates_and_customers_generator
+
+    faker = dates_and_customers_generator.build_faker()
+    customers, seconds = timed(
+        dates_and_customers_generator.generate_base_customers_data,
+        nr_of_customers,
+        faker,
+    )
+    return {"rows": len(customers), "seconds": seconds}
+
+
+def benchmark_write_customers_in_chunks(
+    workdir: str, nr_of_customers: int
+) -> BenchmarkResult:
+    import dates_and_customers_generator
+
+    faker = dates_and_customers_generator.build_faker()
+    filenames = [
+        os.path.join(workdir, "customers.txt"),
+        os.path.join(workdir, "customers.npy"),
+    ]
+    _, seconds = timed(
+        dates_and_customers_generator.write_customers_in_chunks,
+        nr_of_customers,
+        *filenames,
+        faker,
+        SEED,
+    )
+    return {
+        "rows": nr_of_customers,
+        "seconds": seconds,
+        "output_bytes": get_file_sizes(filenames),
+    }
+
+
+def benchmark_extend_loans_info(workdir: str, nr_of_customers: int) -> BenchmarkResult:
+    import loans
+
+    customers, dates = read_inputs(workdir)
+    random.seed(SEED)
+    held_loans, seconds = timed(loans.extend_loans_info, customers, dates)
+    return {"rows": len(held_loans), "seconds": seconds}
+
+
+def benchmark_loans_data_generator(
+    workdir: str, nr_of_customers: int
+) -> BenchmarkResult:
+    import loans
+
+    held_loans, dates = build_loans(workdir)
+    nr_of_rows, seconds = timed(
+        lambda: sum(1 for loan in held_loans for _ in loans.data_generator(loan, dates))
+    )
+    return {"rows": nr_of_rows, "seconds": seconds}
+
+
+def benchmark_monthly_spend_data_generator(
+    workdir: str, nr_of_customers: int
+) -> BenchmarkResult:
+    import monthly_spend
+
+    customers, dates = read_inputs(workdir)
+    random.seed(SEED)
+    customers = monthly_spend.extend_base_customers_info(customers)
+    nr_of_rows, seconds = timed(
+        lambda: sum(
+            1
+            for customer in customers
+            for _ in monthly_spend.data_generator(customer, dates)
+        )
+    )
+    return {"rows": nr_of_rows, "seconds": seconds}
+
+
+def _get_loans_writer(workdir: str) -> Any:
+    import loans
+    from utils import Writer
+
+    held_loans, dates = build_loans(workdir)
+    return Writer(
+        os.path.join(workdir, "loans"),
+        loans.data_generator,
+        held_loans,
+        dates,
+        SEED,
+        fields=loans.RECORD_FIELDS,
+    )
+
+
+def benchmark_generate_data_as_temp_files(
+    workdir: str, nr_of_customers: int
+) -> BenchmarkResult:
+    writer = _get_loans_writer(workdir)
+    filenames, seconds = timed(writer.generate_data_as_temp_files)
+    return {
+        "rows": count_csv_rows(filenames),
+        "seconds": seconds,
+        "output_bytes": get_file_sizes(filenames),
+    }
+
+
+def benchmark_merge_temp_files_as_csv(
+    workdir: str, nr_of_customers: int
+) -> BenchmarkResult:
+    import loans
+
+    writer = _get_loans_writer(workdir)
+    filenames = writer.generate_data_as_temp_files()
+    _, seconds = timed(writer.merge_temp_files_as_csv, loans.HEADERS, filenames)
+    output_filenames = [f"{writer.out_filename}.csv"]
+    return {
+        "rows": count_csv_rows(output_filenames) - 1,
+        "seconds": seconds,
+        "output_bytes": get_file_sizes(output_filenames),
+    }
+
+
+def benchmark_generate_data_as_avro(
+    workdir: str, nr_of_customers: int
+) -> BenchmarkResult:
+    writer = _get_loans_writer(workdir)
+    _, seconds = timed(
+        writer.generate_data_as_avro,
+        os.path.join(DATA_GENERATORS_DIR, "avro", "loan.avsc"),
+    )
+    return {
+        "rows": sum(loan.nr_of_months for loan in writer.elements),
+        "seconds": seconds,
+        "output_bytes": get_file_sizes([f"{writer.out_filename}.avro"]),
+    }
+
+
+def _get_etl_inputs(workdir: str) -> list[str]:
+    return [
+        os.path.join(get_output_dir(workdir), filename)
+        for filename in ("loans.csv", "monthly_spend.csv")
+    ]
+
+
+def benchmark_beam_pipeline(workdir: str, nr_of_customers: int) -> BenchmarkResult:
+    import beam_pipeline
+
+    os.chdir(os.path.join(workdir, "etl"))
+    _, seconds = timed(beam_pipeline.run_pipeline)
+    input_filenames = _get_etl_inputs(workdir)
+    return {
+        "rows": count_csv_rows(input_filenames) - len(input_filenames),
+        "seconds": seconds,
+        "output_bytes": get_file_sizes(glob.glob("outputs/final*")),
+    }
+
+
+def benchmark_pandas_scoring(workdir: str, nr_of_customers: int) -> BenchmarkResult:
+    import pandas_scoring
+
+    input_filenames = _get_etl_inputs(workdir)
+    output_filename, seconds = timed(
+        pandas_scoring.run_scoring,
+        *input_filenames,
+        os.path.join(workdir, "etl", "outputs", "pandas"),
+    )
+    return {
+        "rows": count_csv_rows(input_filenames) - len(input_filenames),
+        "seconds": seconds,
+        "output_bytes": get_file_sizes([output_filename]),
+    }
+
+
+def benchmark_numpy_scoring(workdir: str, nr_of_customers: int) -> BenchmarkResult:
+    import numpy_scoring
+
+    input_filenames = _get_etl_inputs(workdir)
+    output_filename, seconds = timed(
+        numpy_scoring.run_scoring,
+        *input_filenames,
+        os.path.join(workdir, "etl", "outputs", "numpy"),
+    )
+    return {
+        "rows": count_csv_rows(input_filenames) - len(input_filenames),
+        "seconds": seconds,
+        "output_bytes": get_file_sizes([output_filename]),
+    }
+
+
+BENCHMARKS = {
+    "generate_base_customers_data": benchmark_generate_base_customers_data,
+    "write_customers_in_chunks": benchmark_write_customers_in_chunks,
+    "extend_loans_info": benchmark_extend_loans_info,
+    "loans_data_generator": benchmark_loans_data_generator,
+    "monthly_spend_data_generator": benchmark_monthly_spend_data_generator,
+    "generate_data_as_temp_files": benchmark_generate_data_as_temp_files,
+    "merge_temp_files_as_csv": benchmark_merge_temp_files_as_csv,
+    "generate_data_as_avro": benchmark_generate_data_as_avro,
+    "beam_pipeline": benchmark_beam_pipeline,
+    "pandas_scoring": benchmark_pandas_scoring,
+    "numpy_scoring": benchmark_numpy_scoring,
+}
+
+
+def run_benchmark(name: str, workdir: str, nr_of_customers: int) -> BenchmarkResult:
+    result = BENCHMARKS[name](workdir, nr_of_customers)
+    result["rows_per_second"] = result["rows"] / result["seconds"]
+    result["peak_rss_in_bytes"] = get_peak_rss_in_bytes()
+    result["peak_children_rss_in_bytes"] = (
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+    )
+    return result
+
+
+def run_in_subprocess(name: str, workdir: str, nr_of_customers: int) -> BenchmarkResult:
+    benchmark_dir = tempfile.mkdtemp(dir=workdir)
+    os.symlink(
+        os.path.join(workdir, "data_generators"),
+        os.path.join(benchmark_dir, "data_generators"),
+    )
+    os.makedirs(os.path.join(benchmark_dir, "etl", "outputs"))
+    process = subprocess.run(
+        [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--run",
+            name,
+            "--workdir",
+            benchmark_dir,
+            "--scales",
+            str(nr_of_customers),
+        ],
+        capture_output=True,
+        text=True,
+    )
+    shutil.rmtree(benchmark_dir)
+    if process.returncode:
+        return {"error": process.stderr.strip().splitlines()[-1]}
+    return json.loads(process.stdout.splitlines()[-1])
+
+
+def get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=DATA_GENERATORS_DIR,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    names: list[str], scales: list[int], nr_of_years: int
+) -> list[BenchmarkResult]:
+    results = []
+    for nr_of_customers in scales:
+        workdir = tempfile.mkdtemp(prefix="loans-benchmarks-")
+        try:
+            prepare_inputs(workdir, nr_of_customers, nr_of_years)
+            for name in names:
+                result = {
+                    "benchmark": name,
+                    "nr_of_customers": nr_of_customers,
+                    **run_in_subprocess(name, workdir, nr_of_customers),
+                }
+                print(json.dumps(result), flush=True)
+                results.append(result)
+        finally:
+            shutil.rmtree(workdir)
+    return results
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--benchmarks",
+        type=str,
+        nargs="+",
+        default=list(BENCHMARKS),
+        choices=list(BENCHMARKS),
+        help="Benchmarks to run (default: all)",
+    )
+    parser.add_argument(
+        "--scales",
+        type=int,
+        nargs="+",
+        default=list(SCALES),
+        help="Nr of customers for every benchmark run",
+    )
+    parser.add_argument(
+        "--nr-of-years", type=int, default=NR_OF_YEARS, help="Nr of years of data"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="JSON file with results (default: results/benchmarks-<timestamp>.json)",
+    )
+    parser.add_argument("--run", type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", type=str, default=None, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.path[1:1] = [DATA_GENERATORS_DIR, ETL_DIR]
+    args = parse_arguments()
+    if args.run:
+        print(json.dumps(run_benchmark(args.run, args.workdir, args.scales[0])))
+        sys.exit()
+
+    started_at = datetime.datetime.now(datetime.timezone.utc)
+    results = run_benchmarks(args.benchmarks, args.scales, args.nr_of_years)
+    output_filename = args.output or os.path.join(
+        RESULTS_DIR, f"benchmarks-{started_at:%Y%m%dT%H%M%SZ}.json"
+    )
+    os.makedirs(os.path.dirname(output_filename) or ".", exist_ok=True)
+    with open(output_filename, "w") as file:
+        json.dump(
+            {
+                "started_at": started_at.isoformat(),
+                "commit": get_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "nr_of_years": args.nr_of_years,
+                "results": results,
+            },
+            file,
+            indent=2,
+        )
+    print(f"Results written to {output_filename}")
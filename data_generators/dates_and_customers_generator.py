@@ -1,26 +1,177 @@
 import argparse
 import datetime
-from typing import NoReturn, Union
+import multiprocessing
+from typing import Any, NoReturn, Optional, Union
 
+import numpy as np
 from dateutil.rrule import MONTHLY, rrule
-from faker import Faker
 
-FOLDER_NAME_FOR_FILES = "output"
-DATES_FILENAME = f"{FOLDER_NAME_FOR_FILES}/dates.txt"
-CUSTOMERS_FILENAME = f"{FOLDER_NAME_FOR_FILES}/customers.txt"
+from utils import (
+    CUSTOMERS_ARRAY_FILENAME,
+    CUSTOMERS_FILENAME,
+    DATES_ARRAY_FILENAME,
+    DATES_FILENAME,
+    customers_to_array,
+    dates_to_array,
+    get_customers_dtype
+)
+
 DATES_MIN_VALUE_IN_YEARS = CUSTOMERS_MIN_VALUE = 1
 
+CUSTOMERS_CHUNK_SIZE = 1_000_000
+NAME_POOL_SIZE = 20_000
+FAKER_LOCALE = "en_US"
+FAKER_PROVIDERS = ("faker.providers.person", "faker.providers.isbn")
+CUSTOMER_ID_BODY_DIGITS = 9
+CUSTOMER_ID_RANGE = 10**CUSTOMER_ID_BODY_DIGITS
+CUSTOMER_ID_DIGIT_POWERS = np.uint64(10) ** np.arange(
+    CUSTOMER_ID_BODY_DIGITS - 1, -1, -1, dtype=np.uint64
+)
+CUSTOMER_ID_CHECK_WEIGHTS = np.arange(1, CUSTOMER_ID_BODY_DIGITS + 1, dtype=np.uint64)
+CUSTOMER_ID_CHECK_DIGITS = np.frombuffer(b"0123456789X", dtype=np.uint8)
+FEISTEL_HALF_BITS = 15
+FEISTEL_HALF_MASK = (1 << FEISTEL_HALF_BITS) - 1
+FEISTEL_MULTIPLIER = np.uint64(0x9E3779B1)
+FEISTEL_WORD_MASK = np.uint64(0xFFFFFFFF)
+FEISTEL_ROUNDS = 4
+
+Chunk = tuple[int, int, int]
+NamePool = tuple[np.ndarray, np.ndarray]
+
+_generation_options: Optional[dict[str, Any]] = None
+
+
+def build_faker(seed: Optional[int] = None) -> Any:
+    from faker import Faker
 
-def generate_base_customers_data(nr_of_customers: int) -> list[str]:
+    faker = Faker(FAKER_LOCALE, providers=list(FAKER_PROVIDERS))
+    if seed is not None:
+        faker.seed_instance(seed)
+    return faker
+
+
+def generate_base_customers_data(
+    nr_of_customers: int, faker: Any
+) -> list[tuple[str, str, str]]:
     customers = []
     for _ in range(nr_of_customers):
-        customer_id = fake.isbn10(separator="")
-        first_name = fake.first_name()
-        last_name = fake.last_name()
-        customers.append(", ".join([customer_id, first_name, last_name]) + "\n")
+        customer_id = faker.isbn10(separator="")
+        first_name = faker.first_name()
+        last_name = faker.last_name()
+        customers.append((customer_id, first_name, last_name))
     return customers
 
 
+def build_name_pool(faker: Any, pool_size: int = NAME_POOL_SIZE) -> NamePool:
+    first_names = np.array([faker.first_name() for _ in range(pool_size)])
+    last_names = np.array([faker.last_name() for _ in range(pool_size)])
+    return first_names, last_names
+
+
+def _feistel_encrypt(values: np.ndarray, round_keys: np.ndarray) -> np.ndarray:
+    left = values >> np.uint64(FEISTEL_HALF_BITS)
+    right = values & np.uint64(FEISTEL_HALF_MASK)
+    for round_key in round_keys:
+        mixed = (right ^ round_key) * FEISTEL_MULTIPLIER & FEISTEL_WORD_MASK
+        mixed ^= mixed >> np.uint64(16)
+        left, right = right, left ^ (mixed & np.uint64(FEISTEL_HALF_MASK))
+    return (left << np.uint64(FEISTEL_HALF_BITS)) | right
+
+
+def permute_customer_numbers(numbers: np.ndarray, round_keys: np.ndarray) -> np.ndarray:
+    permuted = _feistel_encrypt(numbers, round_keys)
+    out_of_range = permuted >= CUSTOMER_ID_RANGE
+    while out_of_range.any():
+        permuted[out_of_range] = _feistel_encrypt(permuted[out_of_range], round_keys)
+        out_of_range = permuted >= CUSTOMER_ID_RANGE
+    return permuted
+
+
+def format_isbn10_customer_ids(numbers: np.ndarray) -> np.ndarray:
+    digits = numbers[:, None] // CUSTOMER_ID_DIGIT_POWERS % np.uint64(10)
+    check_digits = (digits * CUSTOMER_ID_CHECK_WEIGHTS).sum(axis=1) % np.uint64(11)
+    characters = np.empty((len(numbers), CUSTOMER_ID_BODY_DIGITS + 1), np.uint8)
+    characters[:, :-1] = digits + ord("0")
+    characters[:, -1] = CUSTOMER_ID_CHECK_DIGITS[check_digits]
+    return characters.view(f"S{CUSTOMER_ID_BODY_DIGITS + 1}").ravel()
+
+
+def _init_customers_worker(generation_options: dict[str, Any]) -> None:
+    global _generation_options
+    _generation_options = generation_options
+
+
+def _generate_customers_chunk(chunk: Chunk) -> tuple[str, np.ndarray]:
+    chunk_nr, chunk_start, chunk_stop = chunk
+    rng = np.random.default_rng([_generation_options["seed"], chunk_nr])
+    first_names, last_names = _generation_options["name_pool"]
+    first_name_indexes = rng.integers(0, len(first_names), chunk_stop - chunk_start)
+    last_name_indexes = rng.integers(0, len(last_names), chunk_stop - chunk_start)
+
+    customer_numbers = permute_customer_numbers(
+        np.arange(chunk_start, chunk_stop, dtype=np.uint64),
+        _generation_options["round_keys"],
+    )
+    customer_ids = format_isbn10_customer_ids(customer_numbers)
+    customers = np.empty(chunk_stop - chunk_start, _generation_options["dtype"])
+    customers["customer_id"] = customer_ids
+    customers["first_name"] = np.char.encode(first_names)[first_name_indexes]
+    customers["last_name"] = np.char.encode(last_names)[last_name_indexes]
+
+    rows = zip(
+        customer_ids.astype(str).tolist(),
+        first_names[first_name_indexes].tolist(),
+        last_names[last_name_indexes].tolist(),
+    )
+    return "".join(["%s, %s, %s\n" % row for row in rows]), customers
+
+
+def write_customers_in_chunks(
+    nr_of_customers: int,
+    filename: str,
+    array_filename: str,
+    faker: Any,
+    seed: Optional[int] = None,
+    chunk_size: int = CUSTOMERS_CHUNK_SIZE,
+    nr_of_workers: Optional[int] = None,
+) -> None:
+    if nr_of_customers > CUSTOMER_ID_RANGE:
+        raise ValueError(f"Can not generate more than {CUSTOMER_ID_RANGE} unique ids")
+    seed = seed if seed is not None else np.random.SeedSequence().entropy
+    name_pool = build_name_pool(faker)
+    name_width = max(
+        np.char.str_len(np.char.encode(names)).max() for names in name_pool
+    )
+    generation_options = {
+        "seed": seed,
+        "name_pool": name_pool,
+        "round_keys": np.random.default_rng(seed).integers(
+            0, 1 << 32, FEISTEL_ROUNDS, dtype=np.uint64
+        ),
+        "dtype": get_customers_dtype(name_width),
+    }
+    chunks = [
+        (chunk_nr, chunk_start, min(chunk_start + chunk_size, nr_of_customers))
+        for chunk_nr, chunk_start in enumerate(range(0, nr_of_customers, chunk_size))
+    ]
+    customers_array = np.lib.format.open_memmap(
+        array_filename,
+        mode="w+",
+        dtype=generation_options["dtype"],
+        shape=(nr_of_customers,),
+    )
+    with multiprocessing.Pool(
+        nr_of_workers,
+        initializer=_init_customers_worker,
+        initargs=(generation_options,),
+    ) as pool, open(filename, "w") as file:
+        chunk_results = pool.imap(_generate_customers_chunk, chunks)
+        for chunk, (customers_chunk, customers) in zip(chunks, chunk_results):
+            file.write(customers_chunk)
+            customers_array[chunk[1] : chunk[2]] = customers
+    customers_array.flush()
+
+
 def generate_dates(nr_of_years: int) -> list[str]:
     year_to = datetime.date.today().year - 1
     date_to = datetime.date(year_to, 12, 1)
@@ -54,7 +205,7 @@ def int_with_min_value(min_value: int) -> Union[NoReturn, int]:
     return int_checker
 
 
-def parse_arguments() -> tuple[int, int]:
+def parse_arguments() -> argparse.Namespace:
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "customer", type=int_with_min_value(CUSTOMERS_MIN_VALUE), help="Nr of customers"
@@ -62,15 +213,49 @@ def parse_arguments() -> tuple[int, int]:
     parser.add_argument(
         "years", type=int_with_min_value(DATES_MIN_VALUE_IN_YEARS), help="Nr of years"
     )
-    args = parser.parse_args()
-    return args.customer, args.years
+    parser.add_argument(
+        "--high-volume",
+        action="store_true",
+        help="Sample names from a pool and generate unique ids in parallel chunks",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=None, help="Seed for reproducible customers"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int_with_min_value(1),
+        default=CUSTOMERS_CHUNK_SIZE,
+        help="Nr of customers generated by a worker at once in high volume mode",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Nr of worker processes in high volume mode (default: nr of CPUs)",
+    )
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    fake = Faker()
-    nr_of_customers, nr_of_years = parse_arguments()
+    args = parse_arguments()
+    faker = build_faker(args.seed)
 
-    customers = generate_base_customers_data(nr_of_customers)
-    write_to_file(customers, CUSTOMERS_FILENAME)
-    dates = generate_dates(nr_of_years)
+    if args.high_volume:
+        write_customers_in_chunks(
+            args.customer,
+            CUSTOMERS_FILENAME,
+            CUSTOMERS_ARRAY_FILENAME,
+            faker,
+            args.seed,
+            args.chunk_size,
+            args.workers,
+        )
+    else:
+        customers = generate_base_customers_data(args.customer, faker)
+        write_to_file(
+            [", ".join(customer) + "\n" for customer in customers], CUSTOMERS_FILENAME
+        )
+        np.save(CUSTOMERS_ARRAY_FILENAME, customers_to_array(customers))
+    dates = generate_dates(args.years)
     write_to_file(dates, DATES_FILENAME)
+    np.save(DATES_ARRAY_FILENAME, dates_to_array([date.rstrip() for date in dates]))
@@ -1,21 +1,34 @@
-import glob
+import functools
 import random
 import uuid
 from dataclasses import (
-    asdict,
-    dataclass
+    dataclass,
+    replace
 )
 from typing import (
     Any,
-    Iterator
+    Callable,
+    Iterable,
+    Iterator,
+    Sequence
 )
 
+import numpy as np
+
 from utils import (
-    CUSTOMERS_FILENAME,
-    DATES_FILENAME,
+    CHECKPOINT_EXTENSION,
     FOLDER_NAME_FOR_FILES,
+    CustomerElements,
+    GeneratorCheckpoint,
+    Metrics,
     Reader,
-    Writer
+    Writer,
+    delete_checkpoint,
+    extend_dates_files,
+    generate_next_dates,
+    load_checkpoint,
+    measure_stage,
+    save_checkpoint
 )
 
 HEADERS = [
@@ -30,6 +43,7 @@ HEADERS = [
     "payment_date",
     "payment_amount_in_usd",
 ]
+RECORD_FIELDS = (*HEADERS[:-1], "payment_amount")
 
 LOAN_NR_OF_MONTHS_RANGE = {"min": 6, "max": 50}
 LOAN_DUE_DAY_OF_MONTH_RANGE = {"min": 22, "max": 26}
@@ -41,11 +55,27 @@ LACK_OF_PAYMENT_PROBABILITY = 0.01
 PAYMENT_DEVIATION_IN_PERCENTS = 0.1
 
 OUTPUT_FILE_NAME = f"{FOLDER_NAME_FOR_FILES}/loans"
+CHECKPOINT_FILENAME = f"{OUTPUT_FILE_NAME}.{CHECKPOINT_EXTENSION}"
+DATE_FIELDS = ("due_date", "payment_date")
 PATH_TO_AVRO_SCHEMA = "avro/loan.avsc"
 
 
 @dataclass
 class Loan:
+    __slots__ = (
+        "customer_id",
+        "first_name",
+        "last_name",
+        "loan_id",
+        "loan_category",
+        "start_dates_index",
+        "nr_of_months",
+        "due_amount_in_usd",
+        "due_day",
+        "min_payment_amount_in_usd",
+        "max_payment_amount_in_usd",
+    )
+
     customer_id: str
     first_name: str
     last_name: str
@@ -70,19 +100,37 @@ def _generate_loan_dates_indexes(dates: list[tuple[Any, ...]]) -> tuple[int, int
     return start_month_index, loan_length_in_months
 
 
+def _generate_next_loan_dates_indexes(dates: list[tuple[Any, ...]]) -> tuple[int, int]:
+    loan_length_in_months = random.randint(
+        LOAN_NR_OF_MONTHS_RANGE["min"], LOAN_NR_OF_MONTHS_RANGE["max"]
+    )
+    start_month_index = random.randint(0, len(dates) - 1)
+    return start_month_index, loan_length_in_months
+
+
+def _get_loan_months_indexes(loan: Loan, nr_of_dates: int) -> tuple[int, int]:
+    first_month_index = max(loan.start_dates_index, 0)
+    stop_month_index = min(loan.start_dates_index + loan.nr_of_months, nr_of_dates)
+    return first_month_index, max(stop_month_index, first_month_index)
+
+
 def extend_loans_info(
-    base_customers_info: list[tuple[Any, ...]], dates: list[tuple[Any, ...]]
+    base_customers_info: Iterable[tuple[str, ...]],
+    dates: list[tuple[Any, ...]],
+    generate_loan_dates_indexes: Callable[
+        [list[tuple[Any, ...]]], tuple[int, int]
+    ] = _generate_loan_dates_indexes,
 ) -> list[Loan]:
     base_infos = []
 
     for base_customer in base_customers_info:
         customer_id, first_name, last_name = base_customer
-        loan_id = uuid.uuid4().hex
+        loan_id = uuid.UUID(int=random.getrandbits(128), version=4).hex
         loan_category = random.choice(
             list(LOAN_TYPES_WITH_MAX_COST_VALUE_IN_USD.keys())
         )
         max_due_amount_value = LOAN_TYPES_WITH_MAX_COST_VALUE_IN_USD[loan_category]
-        start_dates_index, loan_length_in_months = _generate_loan_dates_indexes(dates)
+        start_dates_index, loan_length_in_months = generate_loan_dates_indexes(dates)
         due_amount_in_usd = random.randint(
             LOAN_MIN_COST_VALUE_IN_USD, max_due_amount_value
         )
@@ -108,49 +156,202 @@ def extend_loans_info(
     return base_infos
 
 
+def move_loans_past_dates(loans: Sequence[Loan], nr_of_dates: int) -> list[Loan]:
+    return [
+        replace(loan, start_dates_index=loan.start_dates_index - nr_of_dates)
+        for loan in loans
+    ]
+
+
+def renew_finished_loans(
+    loans: Sequence[Loan], dates: list[tuple[Any, ...]]
+) -> list[Loan]:
+    finished_loans = [
+        index
+        for index, loan in enumerate(loans)
+        if loan.start_dates_index + loan.nr_of_months <= 0
+    ]
+    new_loans = extend_loans_info(
+        [
+            (loans[index].customer_id, loans[index].first_name, loans[index].last_name)
+            for index in finished_loans
+        ],
+        dates,
+        _generate_next_loan_dates_indexes,
+    )
+    renewed_loans = list(loans)
+    for index, new_loan in zip(finished_loans, new_loans):
+        renewed_loans[index] = new_loan
+    return renewed_loans
+
+
 def data_generator(
     loan: Loan, dates: list[tuple[Any, ...]]
-) -> Iterator[dict[str, Any]]:
-    loan_months = dates[
-        loan.start_dates_index : loan.nr_of_months + loan.start_dates_index
-    ]
-    record = asdict(loan)
-    del record["start_dates_index"]
-    del record["due_day"]
-    del record["min_payment_amount_in_usd"]
-    del record["max_payment_amount_in_usd"]
+) -> Iterator[tuple[Any, ...]]:
+    first_month_index, stop_month_index = _get_loan_months_indexes(loan, len(dates))
+    loan_months = dates[first_month_index:stop_month_index]
+    loan_fields = (
+        loan.customer_id,
+        loan.first_name,
+        loan.last_name,
+        loan.loan_id,
+        loan.loan_category,
+        loan.nr_of_months,
+        loan.due_amount_in_usd,
+    )
 
     for raw_month in loan_months:
-        record_to_write = record.copy()
         date_without_day = raw_month[0][2:]
         full_due_date = f"{loan.due_day}{date_without_day}"
-        record_to_write["due_date"] = full_due_date
         payment_day = random.randint(
             LOAN_PAYMENT_DAY_OF_MONTH_RANGE["min"],
             LOAN_PAYMENT_DAY_OF_MONTH_RANGE["max"],
         )
         full_payment_date = f"{payment_day}{date_without_day}"
-        record_to_write["payment_date"] = full_payment_date
 
-        record_to_write["payment_amount"] = 0
+        payment_amount = 0
         if random.random() > LACK_OF_PAYMENT_PROBABILITY:
-            record_to_write["payment_amount"] = random.randint(loan.min_payment_amount_in_usd, loan.max_payment_amount_in_usd)
-        yield record_to_write
+            payment_amount = random.randint(
+                loan.min_payment_amount_in_usd, loan.max_payment_amount_in_usd
+            )
+        yield (*loan_fields, full_due_date, full_payment_date, payment_amount)
+
+
+def columnar_data_generator(
+    loans: list[Loan], dates: list[tuple[Any, ...]], rng: np.random.Generator
+) -> dict[str, np.ndarray]:
+    loan_months_indexes = np.array(
+        [_get_loan_months_indexes(loan, len(dates)) for loan in loans]
+    ).reshape(-1, 2)
+    first_month_indexes = loan_months_indexes[:, 0]
+    nr_of_months = loan_months_indexes[:, 1] - first_month_indexes
+    total_nr_of_rows = int(nr_of_months.sum())
+    loan_indexes = np.repeat(np.arange(len(loans)), nr_of_months)
+    first_row_of_loan = np.repeat(np.cumsum(nr_of_months) - nr_of_months, nr_of_months)
+    month_indexes = (
+        first_month_indexes[loan_indexes]
+        + np.arange(total_nr_of_rows)
+        - first_row_of_loan
+    )
+    dates_without_day = np.array([date[0][2:] for date in dates])[month_indexes]
+
+    def loan_column(field: str) -> np.ndarray:
+        return np.array([getattr(loan, field) for loan in loans])[loan_indexes]
+
+    payment_days = rng.integers(
+        LOAN_PAYMENT_DAY_OF_MONTH_RANGE["min"],
+        LOAN_PAYMENT_DAY_OF_MONTH_RANGE["max"],
+        size=total_nr_of_rows,
+        endpoint=True,
+    )
+    payment_amounts = rng.integers(
+        loan_column("min_payment_amount_in_usd"),
+        loan_column("max_payment_amount_in_usd"),
+        endpoint=True,
+    )
+    lack_of_payment = rng.random(total_nr_of_rows) <= LACK_OF_PAYMENT_PROBABILITY
+    payment_amounts[lack_of_payment] = 0
+
+    return {
+        "customer_id": loan_column("customer_id"),
+        "first_name": loan_column("first_name"),
+        "last_name": loan_column("last_name"),
+        "loan_id": loan_column("loan_id"),
+        "loan_category": loan_column("loan_category"),
+        "nr_of_months": loan_column("nr_of_months"),
+        "due_amount_in_usd": loan_column("due_amount_in_usd"),
+        "due_date": np.char.add(loan_column("due_day").astype(str), dates_without_day),
+        "payment_date": np.char.add(payment_days.astype(str), dates_without_day),
+        "payment_amount": payment_amounts,
+    }
 
 
 if __name__ == "__main__":
-    output_extension = Writer.parse_arguments()
+    args = Writer.parse_arguments()
+    output_extension = args.extension
+    save_state = args.checkpoint or bool(args.append_months)
+
+    metrics = None
+    if args.progress or args.metrics:
+        metrics = Metrics("loans", args.progress)
 
-    reader = Reader()
-    base_customers_info = reader.read_data_from_file(CUSTOMERS_FILENAME)
-    dates = reader.read_data_from_file(DATES_FILENAME)
-    loans = extend_loans_info(base_customers_info, dates)
+    loans: Sequence[Loan]
+    with measure_stage(metrics, "prepare_loans") as stage:
+        if args.append_months:
+            checkpoint = load_checkpoint(CHECKPOINT_FILENAME)
+            random.setstate(checkpoint.random_state)
+            dates = generate_next_dates(checkpoint.last_date, args.append_months)
+            extend_dates_files(dates)
+            loans = renew_finished_loans(checkpoint.elements, dates)
+            seed, month_offset = checkpoint.seed, checkpoint.nr_of_months
+        else:
+            random.seed(args.seed)
+            dates = Reader().read_dates()
+            loans = CustomerElements(functools.partial(extend_loans_info, dates=dates))
+            seed, month_offset = args.seed, 0
+        stage["rows"] += len(loans)
 
-    writer = Writer(OUTPUT_FILE_NAME, data_generator, loans, dates)
+    generator = columnar_data_generator if args.columnar else data_generator
+    writer = Writer(
+        OUTPUT_FILE_NAME,
+        generator,
+        loans,
+        dates,
+        seed,
+        args.columnar,
+        month_offset,
+        track_state=save_state,
+        fields=RECORD_FIELDS,
+        metrics=metrics,
+        write_queue_size=args.write_queue_size,
+        batch_size=args.batch_size,
+    )
     if output_extension == "csv":
-        writer.generate_data_as_temp_files()
-        filenames = glob.glob("*.out")
-        writer.merge_temp_files_as_csv(HEADERS, filenames)
-        writer.delete_temp_files(filenames)
+        filenames = writer.generate_data_as_temp_files(
+            args.chunk_size, args.workers, args.compression
+        )
+        try:
+            writer.merge_temp_files_as_csv(HEADERS, filenames, args.compression)
+        finally:
+            writer.delete_temp_files(filenames)
     elif output_extension == "avro":
-        writer.generate_data_as_avro(PATH_TO_AVRO_SCHEMA)
+        generate_avro = (
+            writer.generate_data_as_single_avro
+            if args.single_file
+            else writer.generate_data_as_avro_parts
+        )
+        generate_avro(
+            PATH_TO_AVRO_SCHEMA,
+            args.chunk_size,
+            args.workers,
+            args.codec,
+            args.sync_interval,
+        )
+    elif output_extension == "parquet":
+        writer.generate_data_as_parquet(
+            PATH_TO_AVRO_SCHEMA,
+            DATE_FIELDS,
+            args.chunk_size,
+            args.workers,
+            args.row_group_size,
+            args.partition_by,
+            args.nr_of_partitions,
+        )
+
+    if save_state:
+        with measure_stage(metrics, "save_checkpoint"):
+            save_checkpoint(
+                CHECKPOINT_FILENAME,
+                GeneratorCheckpoint(
+                    writer.seed,
+                    month_offset + len(dates),
+                    dates[-1][0],
+                    random.getstate(),
+                    move_loans_past_dates(writer.elements, len(dates)),
+                ),
+            )
+    else:
+        delete_checkpoint(CHECKPOINT_FILENAME)
+
+    if metrics is not None and args.metrics:
+        metrics.dump(args.metrics)
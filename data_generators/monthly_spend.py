@@ -1,20 +1,28 @@
-import glob
 import random
-from dataclasses import (
-    asdict,
-    dataclass
-)
+from dataclasses import dataclass
 from typing import (
     Any,
-    Iterator
+    Iterable,
+    Iterator,
+    Sequence
 )
 
+import numpy as np
+
 from utils import (
-    CUSTOMERS_FILENAME,
-    DATES_FILENAME,
+    CHECKPOINT_EXTENSION,
     FOLDER_NAME_FOR_FILES,
+    CustomerElements,
+    GeneratorCheckpoint,
+    Metrics,
     Reader,
-    Writer
+    Writer,
+    delete_checkpoint,
+    extend_dates_files,
+    generate_next_dates,
+    load_checkpoint,
+    measure_stage,
+    save_checkpoint
 )
 
 HEADERS = [
@@ -37,11 +45,23 @@ CHANGE_SPEND_RATE_PROBABILITY = 0.3
 CHANGE_AVAILABLE_MONEY_RATE_PROBABILITY = 0.1
 
 OUTPUT_FILE_NAME = f"{FOLDER_NAME_FOR_FILES}/monthly_spend"
+CHECKPOINT_FILENAME = f"{OUTPUT_FILE_NAME}.{CHECKPOINT_EXTENSION}"
+DATE_FIELDS = ("month",)
 PATH_TO_AVRO_SCHEMA = "avro/customer.avsc"
 
 
 @dataclass
 class Customer:
+    __slots__ = (
+        "customer_id",
+        "first_name",
+        "last_name",
+        "spend_rate",
+        "available_money_rate",
+        "spend_money_in_usd",
+        "available_money_in_usd",
+    )
+
     customer_id: str
     first_name: str
     last_name: str
@@ -52,7 +72,7 @@ class Customer:
 
 
 def extend_base_customers_info(
-    base_customers_info: list[tuple[Any, ...]]
+    base_customers_info: Iterable[tuple[str, ...]]
 ) -> list[Customer]:
     base_infos = []
     for base_customer in base_customers_info:
@@ -88,7 +108,8 @@ def _get_number_based_on_rate(rates_with_ranges: dict[str, str], rate: str) -> i
 
 def data_generator(
     customer: Customer, dates: list[tuple[Any, ...]]
-) -> Iterator[dict[str, Any]]:
+) -> Iterator[tuple[Any, ...]]:
+    customer_fields = (customer.customer_id, customer.first_name, customer.last_name)
     for date in dates:
         unpacked_date = date[0]
         if random.random() < CHANGE_SPEND_RATE_PROBABILITY:
@@ -104,24 +125,204 @@ def data_generator(
         customer.available_money_in_usd = _get_number_based_on_rate(
             TOTAL_AVAILABLE_MONEY_RATES_IN_USD, customer.available_money_rate
         )
-        raw_base_info = asdict(customer)
-        raw_base_info["month"] = unpacked_date
-        yield raw_base_info
+        yield (
+            *customer_fields,
+            customer.spend_rate,
+            customer.available_money_rate,
+            customer.spend_money_in_usd,
+            customer.available_money_in_usd,
+            unpacked_date,
+        )
+
+
+def _generate_rates_walk(
+    initial_rates: np.ndarray,
+    nr_of_rates: int,
+    nr_of_months: int,
+    change_probability: float,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    shape = (len(initial_rates), nr_of_months)
+    rate_changed = rng.random(shape) < change_probability
+    new_rates = rng.integers(0, nr_of_rates, size=shape)
+    last_change = np.where(rate_changed, np.arange(nr_of_months), -1)
+    np.maximum.accumulate(last_change, axis=1, out=last_change)
+    rates_after_change = np.take_along_axis(
+        new_rates, np.maximum(last_change, 0), axis=1
+    )
+    return np.where(last_change >= 0, rates_after_change, initial_rates[:, None])
+
+
+def _get_numbers_based_on_rates(
+    rates_with_ranges: dict[str, str],
+    rate_indexes: np.ndarray,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    ranges = np.array(
+        [
+            [int(nr) for nr in rate_range.split("-")]
+            for rate_range in rates_with_ranges.values()
+        ]
+    )
+    return rng.integers(ranges[rate_indexes, 0], ranges[rate_indexes, 1], endpoint=True)
+
+
+def columnar_data_generator(
+    customers: list[Customer], dates: list[tuple[Any, ...]], rng: np.random.Generator
+) -> dict[str, np.ndarray]:
+    nr_of_months = len(dates)
+    spend_rates = tuple(TOTAL_SPEND_RATES_IN_USD.keys())
+    available_money_rates = tuple(TOTAL_AVAILABLE_MONEY_RATES_IN_USD.keys())
+
+    spend_rate_indexes = _generate_rates_walk(
+        np.array([spend_rates.index(customer.spend_rate) for customer in customers]),
+        len(spend_rates),
+        nr_of_months,
+        CHANGE_SPEND_RATE_PROBABILITY,
+        rng,
+    )
+    available_money_rate_indexes = _generate_rates_walk(
+        np.array(
+            [
+                available_money_rates.index(customer.available_money_rate)
+                for customer in customers
+            ]
+        ),
+        len(available_money_rates),
+        nr_of_months,
+        CHANGE_AVAILABLE_MONEY_RATE_PROBABILITY,
+        rng,
+    )
+
+    spend_money = _get_numbers_based_on_rates(
+        TOTAL_SPEND_RATES_IN_USD, spend_rate_indexes, rng
+    )
+    available_money = _get_numbers_based_on_rates(
+        TOTAL_AVAILABLE_MONEY_RATES_IN_USD, available_money_rate_indexes, rng
+    )
+
+    def customer_column(field: str) -> np.ndarray:
+        return np.repeat(
+            np.array([getattr(customer, field) for customer in customers]),
+            nr_of_months,
+        )
+
+    columns = {
+        "customer_id": customer_column("customer_id"),
+        "first_name": customer_column("first_name"),
+        "last_name": customer_column("last_name"),
+        "spend_rate": np.array(spend_rates)[spend_rate_indexes].ravel(),
+        "available_money_rate": np.array(available_money_rates)[
+            available_money_rate_indexes
+        ].ravel(),
+        "spend_money_in_usd": spend_money.ravel(),
+        "available_money_in_usd": available_money.ravel(),
+        "month": np.tile(np.array([date[0] for date in dates]), len(customers)),
+    }
+
+    if nr_of_months:
+        last_months = zip(
+            spend_rate_indexes[:, -1].tolist(),
+            available_money_rate_indexes[:, -1].tolist(),
+            spend_money[:, -1].tolist(),
+            available_money[:, -1].tolist(),
+        )
+        for customer, last_month in zip(customers, last_months):
+            spend_rate_index, available_money_rate_index, *last_amounts = last_month
+            customer.spend_rate = spend_rates[spend_rate_index]
+            customer.available_money_rate = available_money_rates[
+                available_money_rate_index
+            ]
+            customer.spend_money_in_usd, customer.available_money_in_usd = last_amounts
+    return columns
 
 
 if __name__ == "__main__":
-    output_extension = Writer.parse_arguments()
+    args = Writer.parse_arguments()
+    output_extension = args.extension
+    save_state = args.checkpoint or bool(args.append_months)
+
+    metrics = None
+    if args.progress or args.metrics:
+        metrics = Metrics("monthly_spend", args.progress)
 
-    reader = Reader()
-    base_customers_info = reader.read_data_from_file(CUSTOMERS_FILENAME)
-    dates = reader.read_data_from_file(DATES_FILENAME)
-    customers_info = extend_base_customers_info(base_customers_info)
+    customers_info: Sequence[Customer]
+    with measure_stage(metrics, "prepare_customers") as stage:
+        if args.append_months:
+            checkpoint = load_checkpoint(CHECKPOINT_FILENAME)
+            random.setstate(checkpoint.random_state)
+            dates = generate_next_dates(checkpoint.last_date, args.append_months)
+            extend_dates_files(dates)
+            customers_info = checkpoint.elements
+            seed, month_offset = checkpoint.seed, checkpoint.nr_of_months
+        else:
+            random.seed(args.seed)
+            dates = Reader().read_dates()
+            customers_info = CustomerElements(extend_base_customers_info)
+            seed, month_offset = args.seed, 0
+        stage["rows"] += len(customers_info)
 
-    writer = Writer(OUTPUT_FILE_NAME, data_generator, customers_info, dates)
+    generator = columnar_data_generator if args.columnar else data_generator
+    writer = Writer(
+        OUTPUT_FILE_NAME,
+        generator,
+        customers_info,
+        dates,
+        seed,
+        args.columnar,
+        month_offset,
+        track_state=save_state,
+        fields=HEADERS,
+        metrics=metrics,
+        write_queue_size=args.write_queue_size,
+        batch_size=args.batch_size,
+    )
     if output_extension == "csv":
-        writer.generate_data_as_temp_files()
-        filenames = glob.glob("*.out")
-        writer.merge_temp_files_as_csv(HEADERS, filenames)
-        writer.delete_temp_files(filenames)
+        filenames = writer.generate_data_as_temp_files(
+            args.chunk_size, args.workers, args.compression
+        )
+        try:
+            writer.merge_temp_files_as_csv(HEADERS, filenames, args.compression)
+        finally:
+            writer.delete_temp_files(filenames)
     elif output_extension == "avro":
-        writer.generate_data_as_avro(PATH_TO_AVRO_SCHEMA)
+        generate_avro = (
+            writer.generate_data_as_single_avro
+            if args.single_file
+            else writer.generate_data_as_avro_parts
+        )
+        generate_avro(
+            PATH_TO_AVRO_SCHEMA,
+            args.chunk_size,
+            args.workers,
+            args.codec,
+            args.sync_interval,
+        )
+    elif output_extension == "parquet":
+        writer.generate_data_as_parquet(
+            PATH_TO_AVRO_SCHEMA,
+            DATE_FIELDS,
+            args.chunk_size,
+            args.workers,
+            args.row_group_size,
+            args.partition_by,
+            args.nr_of_partitions,
+        )
+
+    if save_state:
+        with measure_stage(metrics, "save_checkpoint"):
+            save_checkpoint(
+                CHECKPOINT_FILENAME,
+                GeneratorCheckpoint(
+                    writer.seed,
+                    month_offset + len(dates),
+                    dates[-1][0],
+                    random.getstate(),
+                    writer.elements,
+                ),
+            )
+    else:
+        delete_checkpoint(CHECKPOINT_FILENAME)
+
+    if metrics is not None and args.metrics:
+        metrics.dump(args.metrics)
@@ -1,20 +1,423 @@
 import argparse
+import collections
+import contextlib
 import copy
+import datetime
+import errno
+import functools
+import glob
+import gzip
+import itertools
 import json
 import multiprocessing
+import operator
 import os
+import pickle
+import queue
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from dataclasses import dataclass
 from typing import (
     Any,
-    Callable
+    BinaryIO,
+    Callable,
+    ContextManager,
+    Iterator,
+    Optional,
+    Sequence,
+    TextIO,
+    Union,
+    cast
 )
 
-import fastavro
+import numpy as np
 
 BATCH_WRITE_SIZE = 5000
+CHUNK_SIZE = 10000
+AVRO_CODECS = ("null", "deflate", "snappy", "zstandard")
+AVRO_SYNC_INTERVAL = 16000
+AVRO_MAGIC = b"Obj\x01"
+AVRO_SYNC_MARKER_SIZE = 16
+AVRO_READ_BATCH_SIZE = 65536
+MERGE_BUFFER_SIZE = 16 * 2**20
+CSV_COMPRESSIONS = {"gzip": "gz", "zstd": "zst"}
+GZIP_COMPRESS_LEVEL = 6
+ZSTD_COMPRESS_LEVEL = 3
+ZERO_COPY_FALLBACK_ERRNOS = (
+    errno.EBADF,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTSOCK,
+    errno.EOPNOTSUPP,
+    errno.EXDEV,
+)
+DATE_FORMAT = "%d-%m-%Y"
+PARQUET_ROW_GROUP_SIZE = 262144
+PARQUET_PARTITIONINGS = ("year", "customer_hash")
+PARQUET_NR_OF_HASH_PARTITIONS = 16
 
 FOLDER_NAME_FOR_FILES = "output"
 DATES_FILENAME = f"{FOLDER_NAME_FOR_FILES}/dates.txt"
 CUSTOMERS_FILENAME = f"{FOLDER_NAME_FOR_FILES}/customers.txt"
+DATES_ARRAY_FILENAME = f"{FOLDER_NAME_FOR_FILES}/dates.npy"
+CUSTOMERS_ARRAY_FILENAME = f"{FOLDER_NAME_FOR_FILES}/customers.npy"
+CHECKPOINT_EXTENSION = "checkpoint"
+PROMETHEUS_EXTENSION = "prom"
+CUSTOMER_ID_WIDTH = 10
+CUSTOMERS_DECODE_CHUNK_SIZE = 100_000
+
+RecordBatch = Union[dict[str, np.ndarray], Sequence[tuple[Any, ...]]]
+RecordFilter = tuple[str, str, Any]
+
+FILTER_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda field_value, values: field_value in values,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_date(raw_date: str) -> datetime.date:
+    return datetime.datetime.strptime(raw_date, DATE_FORMAT).date()
+
+
+def _matches_filters(record: dict[str, Any], filters: Sequence[RecordFilter]) -> bool:
+    for field, filter_operator, value in filters:
+        field_value = record[field]
+        if isinstance(value, datetime.date):
+            field_value = _parse_date(field_value)
+        if not FILTER_OPERATORS[filter_operator](field_value, value):
+            return False
+    return True
+
+
+def _parse_dates(raw_dates: Sequence[str]) -> np.ndarray:
+    unique_raw_dates, inverse = np.unique(np.asarray(raw_dates), return_inverse=True)
+    unique_dates = np.array(
+        [_parse_date(raw_date) for raw_date in unique_raw_dates], dtype="datetime64[D]"
+    )
+    return unique_dates[inverse]
+
+
+def _avro_schema_to_arrow(
+    avro_schema: dict[str, Any], date_fields: Sequence[str]
+) -> Any:
+    import pyarrow
+
+    arrow_types = {
+        "int": pyarrow.int32(),
+        "long": pyarrow.int64(),
+        "string": pyarrow.string(),
+    }
+    arrow_fields = []
+    for field in avro_schema["fields"]:
+        if field["name"] in date_fields:
+            arrow_type = pyarrow.date32()
+        elif isinstance(field["type"], dict) and field["type"]["type"] == "enum":
+            arrow_type = pyarrow.dictionary(pyarrow.int8(), pyarrow.string())
+        else:
+            arrow_type = arrow_types[field["type"]]
+        arrow_fields.append(pyarrow.field(field["name"], arrow_type))
+    return pyarrow.schema(arrow_fields)
+
+
+def to_month_ordinal(raw_date: str) -> int:
+    date = _parse_date(raw_date)
+    return date.year * 12 + date.month - 1
+
+
+def from_month_ordinal(month_ordinal: int) -> str:
+    return datetime.date(month_ordinal // 12, month_ordinal % 12 + 1, 1).strftime(
+        DATE_FORMAT
+    )
+
+
+def dates_to_array(raw_dates: Sequence[str]) -> np.ndarray:
+    return np.array([to_month_ordinal(raw_date) for raw_date in raw_dates], np.int32)
+
+
+def get_customers_dtype(name_width: int) -> np.dtype:
+    return np.dtype(
+        [
+            ("customer_id", f"S{CUSTOMER_ID_WIDTH}"),
+            ("first_name", f"S{name_width}"),
+            ("last_name", f"S{name_width}"),
+        ]
+    )
+
+
+def customers_to_array(customers: Sequence[tuple[str, ...]]) -> np.ndarray:
+    encoded_customers = [
+        tuple(field.strip().encode() for field in customer) for customer in customers
+    ]
+    name_width = max(
+        (len(name) for customer in encoded_customers for name in customer[1:]),
+        default=1,
+    )
+    return np.array(encoded_customers, dtype=get_customers_dtype(name_width))
+
+
+def iter_customers(customers: np.ndarray) -> Iterator[tuple[str, ...]]:
+    for chunk_start in range(0, len(customers), CUSTOMERS_DECODE_CHUNK_SIZE):
+        chunk = customers[chunk_start : chunk_start + CUSTOMERS_DECODE_CHUNK_SIZE]
+        for customer in chunk.tolist():
+            yield tuple(field.decode() for field in customer)
+
+
+class CustomerElements(Sequence[Any]):
+    def __init__(
+        self,
+        build_elements: Callable[[Iterator[tuple[str, ...]]], list[Any]],
+        filename: str = CUSTOMERS_ARRAY_FILENAME,
+    ) -> None:
+        self._build_elements = build_elements
+        self._filename = filename
+
+    def _read_customers(self) -> np.ndarray:
+        return np.load(self._filename, mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self._read_customers())
+
+    def __getitem__(self, index: Any) -> Any:
+        if not isinstance(index, slice):
+            raise TypeError("CustomerElements are built per shard, use a slice")
+        return self._build_elements(iter_customers(self._read_customers()[index]))
+
+    def __iter__(self) -> Iterator[Any]:
+        for chunk_start in range(0, len(self), CUSTOMERS_DECODE_CHUNK_SIZE):
+            yield from self[chunk_start : chunk_start + CUSTOMERS_DECODE_CHUNK_SIZE]
+
+
+def generate_next_dates(last_raw_date: str, nr_of_months: int) -> list[tuple[str]]:
+    last_month_ordinal = to_month_ordinal(last_raw_date)
+    return [
+        (from_month_ordinal(last_month_ordinal + month_offset),)
+        for month_offset in range(1, nr_of_months + 1)
+    ]
+
+
+def extend_dates_files(
+    dates: list[tuple[str]],
+    array_filename: str = DATES_ARRAY_FILENAME,
+    text_filename: str = DATES_FILENAME,
+) -> None:
+    known_dates = np.load(array_filename)
+    new_dates = dates_to_array([date[0] for date in dates])
+    new_dates = new_dates[~np.isin(new_dates, known_dates)]
+    np.save(array_filename, np.concatenate([known_dates, new_dates]))
+    with open(text_filename, "a") as file:
+        file.writelines(
+            f"{from_month_ordinal(month_ordinal)}\n"
+            for month_ordinal in new_dates.tolist()
+        )
+
+
+@dataclass
+class GeneratorCheckpoint:
+    seed: int
+    nr_of_months: int
+    last_date: str
+    random_state: tuple[Any, ...]
+    elements: Sequence[Any]
+
+
+def save_checkpoint(filename: str, checkpoint: GeneratorCheckpoint) -> None:
+    temp_filename = f"{filename}.tmp"
+    with open(temp_filename, "wb") as file:
+        pickle.dump(checkpoint, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_filename, filename)
+
+
+def load_checkpoint(filename: str) -> GeneratorCheckpoint:
+    if not os.path.exists(filename):
+        raise ValueError(
+            f"{filename} does not exist, generate the output with --checkpoint "
+            "before appending months to it"
+        )
+    with open(filename, "rb") as file:
+        return pickle.load(file)
+
+
+def delete_checkpoint(filename: str) -> None:
+    if os.path.exists(filename):
+        os.remove(filename)
+
+
+def get_peak_rss_in_bytes(who: int = resource.RUSAGE_SELF) -> int:
+    return resource.getrusage(who).ru_maxrss * 1024
+
+
+@dataclass
+class ShardStats:
+    worker: int
+    rows: int
+    bytes: int
+    seconds: float
+    peak_rss_in_bytes: int
+
+
+class Metrics:
+    def __init__(
+        self, name: str, progress: bool = False, stream: TextIO = sys.stderr
+    ) -> None:
+        self.name = name
+        self._progress = progress
+        self._stream = stream
+        self._active_stages: list[str] = []
+        self._stage_started_at: dict[str, float] = {}
+        self.stages: dict[str, dict[str, float]] = {}
+        self.workers: dict[int, dict[str, float]] = {}
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[dict[str, float]]:
+        stage = self.stages.setdefault(
+            name,
+            {"seconds": 0.0, "rows": 0, "bytes": 0, "shards": 0, "total_shards": 0},
+        )
+        self._active_stages.append(name)
+        self._stage_started_at[name] = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage["seconds"] += time.perf_counter() - self._stage_started_at.pop(name)
+            self._active_stages.pop()
+            self._print_progress(name, end="\n")
+
+    def queue_shards(self, nr_of_shards: int) -> None:
+        if self._active_stages:
+            self.stages[self._active_stages[-1]]["total_shards"] += nr_of_shards
+        self.queue_depth += nr_of_shards
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+    def record_shard(self, shard_stats: ShardStats) -> None:
+        self.queue_depth -= 1
+        worker = self.workers.setdefault(
+            shard_stats.worker,
+            {
+                "rows": 0,
+                "bytes": 0,
+                "seconds": 0.0,
+                "shards": 0,
+                "peak_rss_in_bytes": 0,
+            },
+        )
+        worker["rows"] += shard_stats.rows
+        worker["bytes"] += shard_stats.bytes
+        worker["seconds"] += shard_stats.seconds
+        worker["shards"] += 1
+        worker["peak_rss_in_bytes"] = max(
+            worker["peak_rss_in_bytes"], shard_stats.peak_rss_in_bytes
+        )
+        if self._active_stages:
+            stage_name = self._active_stages[-1]
+            stage = self.stages[stage_name]
+            stage["rows"] += shard_stats.rows
+            stage["bytes"] += shard_stats.bytes
+            stage["shards"] += 1
+            self._print_progress(stage_name)
+
+    def get_peak_rss_in_bytes(self) -> int:
+        return max(
+            get_peak_rss_in_bytes(),
+            get_peak_rss_in_bytes(resource.RUSAGE_CHILDREN),
+            *(worker["peak_rss_in_bytes"] for worker in self.workers.values()),
+        )
+
+    def _print_progress(self, stage_name: str, end: str = "") -> None:
+        if not self._progress:
+            return
+        stage = self.stages[stage_name]
+        elapsed = stage["seconds"]
+        if not end:
+            elapsed += time.perf_counter() - self._stage_started_at[stage_name]
+        progress = f"\r[{self.name}] {stage_name}"
+        if stage["total_shards"]:
+            progress += f" {stage['shards']}/{stage['total_shards']} shards"
+        if stage["rows"]:
+            progress += f", {stage['rows']:,} rows"
+            if elapsed:
+                progress += f" ({stage['rows'] / elapsed:,.0f} rows/s)"
+        if stage["bytes"]:
+            progress += f", {stage['bytes'] / 2**20:,.1f} MiB"
+        if end:
+            progress += f" in {elapsed:.2f}s"
+        else:
+            progress += f", queue {self.queue_depth}"
+        progress += f", peak RSS {self.get_peak_rss_in_bytes() / 2**20:,.0f} MiB"
+        print(progress, end=end, file=self._stream, flush=True)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "stages": {
+                name: {
+                    **stage,
+                    "rows_per_second": (
+                        stage["rows"] / stage["seconds"] if stage["seconds"] else 0.0
+                    ),
+                }
+                for name, stage in self.stages.items()
+            },
+            "workers": self.workers,
+            "max_queue_depth": self.max_queue_depth,
+            "peak_rss_in_bytes": self.get_peak_rss_in_bytes(),
+        }
+
+    def as_prometheus_text(self) -> str:
+        metrics = self.as_dict()
+        lines = []
+        for metric in ("seconds", "rows", "bytes", "rows_per_second"):
+            lines.append(f"# TYPE {self.name}_stage_{metric} gauge")
+            lines.extend(
+                f'{self.name}_stage_{metric}{{stage="{name}"}} {stage[metric]}'
+                for name, stage in metrics["stages"].items()
+            )
+        for metric in ("rows", "bytes", "seconds", "peak_rss_in_bytes"):
+            lines.append(f"# TYPE {self.name}_worker_{metric} gauge")
+            lines.extend(
+                f'{self.name}_worker_{metric}{{worker="{pid}"}} {worker[metric]}'
+                for pid, worker in metrics["workers"].items()
+            )
+        for metric in ("max_queue_depth", "peak_rss_in_bytes"):
+            lines.append(f"# TYPE {self.name}_{metric} gauge")
+            lines.append(f"{self.name}_{metric} {metrics[metric]}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, filename: str) -> None:
+        with open(filename, "w") as file:
+            if filename.endswith(PROMETHEUS_EXTENSION):
+                file.write(self.as_prometheus_text())
+            else:
+                json.dump(self.as_dict(), file, indent=2)
+
+
+def measure_stage(
+    metrics: Optional[Metrics], name: str
+) -> ContextManager[dict[str, float]]:
+    if metrics is None:
+        return contextlib.nullcontext(collections.Counter())
+    return metrics.stage(name)
+
+
+def _project_avro_schema(schema: dict[str, Any], fields: set[str]) -> dict[str, Any]:
+    projected_schema = dict(schema)
+    projected_schema["fields"] = [
+        field for field in schema["fields"] if field["name"] in fields
+    ]
+    return projected_schema
 
 
 class Reader:
@@ -25,7 +428,18 @@ class Reader:
                 elements.append(tuple(row.rstrip().split(",")))
         return elements
 
+    def read_customers(self, filename: str = CUSTOMERS_ARRAY_FILENAME) -> np.ndarray:
+        return np.load(filename, mmap_mode="r")
+
+    def read_dates(self, filename: str = DATES_ARRAY_FILENAME) -> list[tuple[str]]:
+        return [
+            (from_month_ordinal(month_ordinal),)
+            for month_ordinal in np.load(filename).tolist()
+        ]
+
     def read_data_from_avro(self, filename: str) -> list[dict[str, Any]]:
+        import fastavro
+
         with open(filename, "rb") as f:
             reader = fastavro.reader(f)
             content = [el for el in reader]
@@ -33,88 +447,886 @@ class Reader:
             print(f"Schema for AVRO file:\n{json.loads(metadata['avro.schema'])}")
         return content
 
+    def iter_avro_records(
+        self,
+        filename_pattern: str,
+        columns: Optional[Sequence[str]] = None,
+        filters: Sequence[RecordFilter] = (),
+    ) -> Iterator[dict[str, Any]]:
+        import fastavro
+
+        for filename in sorted(glob.glob(filename_pattern)):
+            with open(filename, "rb") as f:
+                reader_schema = None
+                if columns is not None:
+                    writer_schema = json.loads(
+                        fastavro.reader(f).metadata["avro.schema"]
+                    )
+                    fields_to_read = {*columns, *(field for field, _, _ in filters)}
+                    reader_schema = _project_avro_schema(writer_schema, fields_to_read)
+                    f.seek(0)
+                for record in fastavro.reader(f, reader_schema=reader_schema):
+                    if not _matches_filters(record, filters):
+                        continue
+                    if columns is not None and len(record) != len(columns):
+                        record = {column: record[column] for column in columns}
+                    yield record
+
+    def iter_avro_batches(
+        self,
+        filename_pattern: str,
+        batch_size: int = AVRO_READ_BATCH_SIZE,
+        columns: Optional[Sequence[str]] = None,
+        filters: Sequence[RecordFilter] = (),
+        batch_format: str = "records",
+    ) -> Iterator[Any]:
+        records = self.iter_avro_records(filename_pattern, columns, filters)
+        while batch := list(itertools.islice(records, batch_size)):
+            if batch_format == "numpy":
+                yield {
+                    key: np.array([record[key] for record in batch]) for key in batch[0]
+                }
+            elif batch_format == "arrow":
+                import pyarrow
+
+                yield pyarrow.RecordBatch.from_pylist(batch)
+            else:
+                yield batch
+
+
+Shard = tuple[int, int, int]
+
+_shared_writer: Optional["Writer"] = None
+
+
+def _init_shared_writer(writer: "Writer") -> None:
+    global _shared_writer
+    _shared_writer = writer
+
+
+def _get_written_bytes(written: Union[str, list[str]]) -> int:
+    filenames = [written] if isinstance(written, str) else written
+    return sum(os.path.getsize(filename) for filename in filenames)
+
+
+def _write_shard(
+    task: tuple[Any, ...]
+) -> tuple[Shard, Any, Optional[Sequence[Any]], ShardStats]:
+    method_name, shard, *args = task
+    started_at = time.perf_counter()
+    _shared_writer._shard_rows = 0
+    written = getattr(_shared_writer, method_name)(shard, *args)
+    shard_stats = ShardStats(
+        os.getpid(),
+        _shared_writer._shard_rows,
+        _get_written_bytes(written),
+        time.perf_counter() - started_at,
+        get_peak_rss_in_bytes(),
+    )
+    return shard, written, _shared_writer._get_shard_state(), shard_stats
+
+
+def _read_avro_long(file: BinaryIO) -> Optional[int]:
+    value = shift = 0
+    while byte := file.read(1):
+        value |= (byte[0] & 0x7F) << shift
+        if not byte[0] & 0x80:
+            return (value >> 1) ^ -(value & 1)
+        shift += 7
+    return None
+
+
+def _encode_avro_long(value: int) -> bytes:
+    value = (value << 1) ^ (value >> 63)
+    encoded = bytearray()
+    while value & ~0x7F:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def _read_avro_header(file: BinaryIO) -> bytes:
+    if file.read(len(AVRO_MAGIC)) != AVRO_MAGIC:
+        raise ValueError(f"{file.name} is not an Avro container file")
+    while nr_of_entries := _read_avro_long(file):
+        if nr_of_entries < 0:
+            _read_avro_long(file)
+            nr_of_entries = -nr_of_entries
+        for _ in range(2 * nr_of_entries):
+            file.read(_read_avro_long(file))
+    return file.read(AVRO_SYNC_MARKER_SIZE)
+
+
+def get_csv_compressor(compression: str) -> Callable[[bytes], bytes]:
+    if compression == "gzip":
+        return functools.partial(
+            gzip.compress, compresslevel=GZIP_COMPRESS_LEVEL, mtime=0
+        )
+    if compression == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=ZSTD_COMPRESS_LEVEL).compress
+    raise ValueError(
+        f"Unknown CSV compression {compression}, use one of "
+        f"{', '.join(CSV_COMPRESSIONS)}"
+    )
+
+
+def _encode_csv_text(
+    csv_text: str, compress: Optional[Callable[[bytes], bytes]] = None
+) -> bytes:
+    data = csv_text.encode()
+    return data if compress is None else compress(data)
+
+
+def _copy_file_range(in_fd: int, out_fd: int, offset: int, count: int) -> int:
+    return os.copy_file_range(in_fd, out_fd, count, offset)
+
+
+def _sendfile(in_fd: int, out_fd: int, offset: int, count: int) -> int:
+    return os.sendfile(out_fd, in_fd, offset, count)
+
+
+def _copy_file_contents(infile: BinaryIO, outfile: BinaryIO) -> int:
+    outfile.flush()
+    in_fd, out_fd = infile.fileno(), outfile.fileno()
+    size = os.fstat(in_fd).st_size
+    copied = 0
+    for copy_chunk, os_function in (
+        (_copy_file_range, "copy_file_range"),
+        (_sendfile, "sendfile"),
+    ):
+        if not hasattr(os, os_function):
+            continue
+        try:
+            while copied < size:
+                nr_of_bytes = copy_chunk(in_fd, out_fd, copied, size - copied)
+                if not nr_of_bytes:
+                    break
+                copied += nr_of_bytes
+            return copied
+        except OSError as error:
+            if copied or error.errno not in ZERO_COPY_FALLBACK_ERRNOS:
+                raise
+    shutil.copyfileobj(infile, outfile, MERGE_BUFFER_SIZE)
+    return size
+
+
+def concatenate_avro_files(
+    out_filename: str, part_filenames: list[str], append: bool = False
+) -> None:
+    if not part_filenames:
+        raise ValueError(f"No Avro part files to concatenate into {out_filename}")
+    header = sync_marker = None
+    if append and os.path.exists(out_filename):
+        with open(out_filename, "rb") as outfile:
+            sync_marker = _read_avro_header(outfile)
+            header_size = outfile.tell()
+            outfile.seek(0)
+            header = outfile.read(header_size - AVRO_SYNC_MARKER_SIZE)
+
+    with open(out_filename, "ab" if append else "wb") as outfile:
+        for part_filename in part_filenames:
+            with open(part_filename, "rb") as part:
+                part_sync_marker = _read_avro_header(part)
+                header_size = part.tell()
+                if sync_marker is None:
+                    part.seek(0)
+                    outfile.write(part.read(header_size))
+                    sync_marker = part_sync_marker
+                elif header is not None:
+                    part.seek(0)
+                    if part.read(header_size - AVRO_SYNC_MARKER_SIZE) != header:
+                        raise ValueError(
+                            f"{part_filename} has a different schema or codec "
+                            f"than {out_filename}"
+                        )
+                    part.seek(header_size)
+                while (nr_of_records := _read_avro_long(part)) is not None:
+                    block_size = _read_avro_long(part)
+                    block = part.read(block_size)
+                    if part.read(AVRO_SYNC_MARKER_SIZE) != part_sync_marker:
+                        raise ValueError(f"Corrupted Avro block in {part_filename}")
+                    outfile.write(_encode_avro_long(nr_of_records))
+                    outfile.write(_encode_avro_long(block_size))
+                    outfile.write(block)
+                    outfile.write(sync_marker)
+
+
+def write_empty_avro_file(out_filename: str, path_to_schema: str, codec: str) -> None:
+    import fastavro
+
+    with open(out_filename, "wb") as outfile:
+        fastavro.writer(outfile, fastavro.schema.load_schema(path_to_schema), [], codec)
+
+
+class BackgroundWriter:
+    def __init__(
+        self,
+        file: BinaryIO,
+        queue_size: int = 0,
+        transform: Optional[Callable[[Any], bytes]] = None,
+    ) -> None:
+        self._file = file
+        self._transform = transform
+        self._queue: Optional[queue.Queue] = None
+        self._errors: list[BaseException] = []
+        if queue_size:
+            self._queue = queue.Queue(maxsize=queue_size)
+            self._thread = threading.Thread(
+                target=self._write_queued, args=(self._queue,), daemon=True
+            )
+            self._thread.start()
+
+    def _write_queued(self, write_queue: queue.Queue) -> None:
+        while (data := write_queue.get()) is not None:
+            try:
+                if not self._errors:
+                    self._write(data)
+            except BaseException as error:
+                self._errors.append(error)
+            finally:
+                write_queue.task_done()
+        write_queue.task_done()
+
+    def _write(self, data: Any) -> None:
+        if self._transform is not None:
+            data = self._transform(data)
+        self._file.write(data)
+
+    def _raise_write_error(self) -> None:
+        if self._errors:
+            raise self._errors[0]
+
+    def write(self, data: Any) -> None:
+        if self._queue is None:
+            self._write(data)
+            return
+        self._raise_write_error()
+        self._queue.put(data)
+
+    def flush(self) -> None:
+        if self._queue is not None:
+            self._queue.join()
+            self._raise_write_error()
+        self._file.flush()
+
+    def seekable(self) -> bool:
+        return False
+
+    def writable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        if self._queue is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._queue = None
+            self._raise_write_error()
+
+    def __enter__(self) -> "BackgroundWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
 
 class Writer:
     def __init__(
         self,
         out_filename: str,
         data_generator: Callable,
-        elements_to_write: list[Any],
+        elements_to_write: Sequence[Any],
         dates: list[tuple[Any, ...]],
+        seed: Optional[int] = None,
+        columnar: bool = False,
+        month_offset: int = 0,
+        track_state: bool = False,
+        fields: Sequence[str] = (),
+        metrics: Optional[Metrics] = None,
+        write_queue_size: int = 0,
+        batch_size: int = BATCH_WRITE_SIZE,
     ) -> None:
         self.out_filename = out_filename
         self._data_generator = data_generator
         self._elements_to_write = elements_to_write
         self._dates = dates
+        self._seed = seed if seed is not None else np.random.SeedSequence().entropy
+        self._columnar = columnar
+        self._month_offset = month_offset
+        self._track_state = track_state
+        self._fields = tuple(fields)
+        self._metrics = metrics
+        self._shard_rows = 0
+        self._shard_elements: Optional[Sequence[Any]] = None
+        self._write_queue_size = write_queue_size
+        self._batch_size = batch_size
 
-    def _get_data_as_temp_file(self, element: Any) -> None:
-        records_to_write = []
-
-        with open(f"{str(os.getpid())}.out", "a") as file:
-            for raw_record_to_write in self._data_generator(element, self._dates):
-                raw_record_to_write = list(raw_record_to_write.values())
-                record_to_write = [str(field) for field in raw_record_to_write]
-                records_to_write.append(f"{','.join(record_to_write)}\n")
-                if len(records_to_write) % BATCH_WRITE_SIZE == 0:
-                    file.writelines(records_to_write)
-                    records_to_write = []
-            file.writelines(records_to_write)
-
-    def generate_data_as_temp_files(self) -> None:
-        pool = multiprocessing.Pool()
-        processes = [
-            pool.apply_async(
-                self._get_data_as_temp_file,
-                args=(element,),
+    @property
+    def seed(self) -> int:
+        return self._seed
+
+    @property
+    def elements(self) -> Sequence[Any]:
+        return self._elements_to_write
+
+    @property
+    def appending(self) -> bool:
+        return self._month_offset > 0
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {**self.__dict__, "_metrics": None}
+
+    def _stage(self, name: str) -> ContextManager[dict[str, float]]:
+        return measure_stage(self._metrics, name)
+
+    def _get_window_name(self) -> str:
+        _, month, year = self._dates[0][0].split("-")
+        return f"{year}{month}"
+
+    @staticmethod
+    def _columns_to_rows(columns: dict[str, np.ndarray]) -> Iterator[tuple[Any, ...]]:
+        return zip(*(column.tolist() for column in columns.values()))
+
+    def _batch_as_dicts(self, batch: RecordBatch) -> Iterator[dict[str, Any]]:
+        if isinstance(batch, dict):
+            keys, rows = tuple(batch.keys()), self._columns_to_rows(batch)
+        elif batch and isinstance(batch[0], dict):
+            return iter(batch)
+        else:
+            keys, rows = self._fields, batch
+        return (dict(zip(keys, row)) for row in rows)
+
+    def _batch_as_columns(self, batch: RecordBatch) -> dict[str, Sequence[Any]]:
+        if isinstance(batch, dict):
+            return batch
+        if isinstance(batch[0], dict):
+            return {key: [record[key] for record in batch] for key in batch[0]}
+        return dict(zip(self._fields, zip(*batch)))
+
+    @staticmethod
+    def _count_batch_rows(batch: RecordBatch) -> int:
+        if isinstance(batch, dict):
+            return len(next(iter(batch.values()), ()))
+        return len(batch)
+
+    @staticmethod
+    def format_batch_as_csv(batch: RecordBatch) -> str:
+        if not len(batch):
+            return ""
+        if isinstance(batch, dict):
+            nr_of_fields, rows = len(batch), Writer._columns_to_rows(batch)
+        elif isinstance(batch[0], dict):
+            nr_of_fields = len(batch[0])
+            rows = (tuple(record.values()) for record in batch)
+        else:
+            nr_of_fields, rows = len(batch[0]), batch
+        row_format = ",".join(["%s"] * nr_of_fields) + "\n"
+        return "".join([row_format % row for row in rows])
+
+    def _get_shards(self, chunk_size: int) -> list[Shard]:
+        return [
+            (shard_nr, shard_start, shard_start + chunk_size)
+            for shard_nr, shard_start in enumerate(
+                range(0, len(self._elements_to_write), chunk_size)
             )
-            for element in self._elements_to_write
         ]
-        [p.get() for p in processes]
+
+    def _get_shard_state(self) -> Optional[Sequence[Any]]:
+        if not self._track_state:
+            return None
+        return self._shard_elements
+
+    def _map_shards(
+        self,
+        method_name: str,
+        shards: list[Shard],
+        nr_of_workers: Optional[int],
+        *args: Any,
+    ) -> list[Any]:
+        results = {}
+        with multiprocessing.Pool(
+            nr_of_workers, initializer=_init_shared_writer, initargs=(self,)
+        ) as pool:
+            if self._metrics is not None:
+                self._metrics.queue_shards(len(shards))
+            for shard, written, shard_state, shard_stats in pool.imap_unordered(
+                _write_shard, [(method_name, shard, *args) for shard in shards]
+            ):
+                results[shard] = written, shard_state
+                if self._metrics is not None:
+                    self._metrics.record_shard(shard_stats)
+        if self._track_state:
+            self._elements_to_write = [
+                element for shard in shards for element in results[shard][1]
+            ]
+        return [results[shard][0] for shard in shards]
+
+    def _generate_shard_batches(self, shard: Shard) -> Iterator[RecordBatch]:
+        shard_nr, shard_start, shard_stop = shard
+        shard_seed = [self._seed, shard_nr]
+        if self.appending:
+            shard_seed.append(self._month_offset)
+        random.seed("-".join(map(str, shard_seed)))
+        elements = self._elements_to_write[shard_start:shard_stop]
+        self._shard_elements = elements
+        if self._columnar:
+            rng = np.random.default_rng(shard_seed)
+            columns = self._data_generator(elements, self._dates, rng)
+            nr_of_rows = self._count_batch_rows(columns)
+            for batch_start in range(0, nr_of_rows, self._batch_size):
+                batch_stop = batch_start + self._batch_size
+                self._shard_rows += min(batch_stop, nr_of_rows) - batch_start
+                yield {
+                    name: values[batch_start:batch_stop]
+                    for name, values in columns.items()
+                }
+            return
+
+        records_to_write = (
+            record
+            for element in elements
+            for record in self._data_generator(element, self._dates)
+        )
+        while batch := list(itertools.islice(records_to_write, self._batch_size)):
+            self._shard_rows += len(batch)
+            yield batch
+
+    def _write_shard_as_temp_file(
+        self, shard: Shard, temp_dir: str, compression: Optional[str] = None
+    ) -> str:
+        temp_filename = os.path.join(temp_dir, f"part-{shard[0]:05d}.out")
+        compress = None
+        if compression is not None:
+            temp_filename = f"{temp_filename}.{CSV_COMPRESSIONS[compression]}"
+            compress = get_csv_compressor(compression)
+        encode = functools.partial(_encode_csv_text, compress=compress)
+
+        with open(temp_filename, "wb") as file, BackgroundWriter(
+            file, self._write_queue_size, encode
+        ) as output:
+            for batch in self._generate_shard_batches(shard):
+                if csv_text := self.format_batch_as_csv(batch):
+                    output.write(csv_text)
+        return temp_filename
+
+    def generate_data_as_temp_files(
+        self,
+        chunk_size: int = CHUNK_SIZE,
+        nr_of_workers: Optional[int] = None,
+        compression: Optional[str] = None,
+    ) -> list[str]:
+        temp_dir = tempfile.mkdtemp(
+            prefix=".parts-", dir=os.path.dirname(self.out_filename) or "."
+        )
+        filenames: list[str] = []
+        try:
+            with self._stage("generate_data_as_temp_files"):
+                filenames = self._map_shards(
+                    "_write_shard_as_temp_file",
+                    self._get_shards(chunk_size),
+                    nr_of_workers,
+                    temp_dir,
+                    compression,
+                )
+        finally:
+            if not filenames:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+        return filenames
+
+    def _delete_other_csv_variants(self, out_filename: str) -> None:
+        extension = "csv"
+        filenames = [f"{self.out_filename}.{extension}"]
+        filenames.extend(
+            f"{self.out_filename}.{extension}.{compression_extension}"
+            for compression_extension in CSV_COMPRESSIONS.values()
+        )
+        for filename in filenames:
+            if filename != out_filename and os.path.exists(filename):
+                os.remove(filename)
 
     def merge_temp_files_as_csv(
-        self, headers: list[str], temp_filenames: list[str]
+        self,
+        headers: list[str],
+        temp_filenames: list[str],
+        compression: Optional[str] = None,
     ) -> None:
         extension = "csv"
 
-        with open(f"{self.out_filename}.{extension}", "w") as outfile:
-            outfile.write(", ".join(headers) + "\n")
+        out_filename = f"{self.out_filename}.{extension}"
+        header = (", ".join(headers) + "\n").encode()
+        if compression is not None:
+            out_filename = f"{out_filename}.{CSV_COMPRESSIONS[compression]}"
+            header = get_csv_compressor(compression)(header)
+        append = self.appending and os.path.exists(out_filename)
+        if not self.appending:
+            self._delete_other_csv_variants(out_filename)
+
+        with self._stage("merge_temp_files_as_csv") as stage, open(
+            out_filename, "r+b" if append else "wb"
+        ) as outfile:
+            outfile.seek(0, os.SEEK_END)
+            if not outfile.tell():
+                outfile.write(header)
             for fname in temp_filenames:
-                with open(fname, "r") as readfile:
-                    infile = readfile.read()
-                    outfile.write(infile)
+                with open(fname, "rb") as readfile:
+                    stage["bytes"] += _copy_file_contents(readfile, outfile)
 
     def generate_data_as_avro(
         self,
         path_to_schema: str,
     ) -> None:
+        import fastavro
+
         extension = "avro"
         parsed_schema = fastavro.schema.load_schema(path_to_schema)
-        records_to_write = []
+        self.delete_avro_files()
+        with self._stage("generate_data_as_avro") as stage:
+            with open(f"{self.out_filename}.{extension}", "wb") as outfile:
+                with BackgroundWriter(outfile, self._write_queue_size) as output:
+                    fastavro.writer(
+                        cast(BinaryIO, output),
+                        parsed_schema,
+                        self._iter_records_as_dicts(stage),
+                    )
+                stage["bytes"] += outfile.tell()
+
+    def _iter_records_as_dicts(
+        self, stage: dict[str, float]
+    ) -> Iterator[dict[str, Any]]:
+        for element in self._elements_to_write:
+            for record in self._data_generator(element, self._dates):
+                stage["rows"] += 1
+                if isinstance(record, dict):
+                    yield record
+                else:
+                    yield dict(zip(self._fields, record))
+
+    def _write_shard_as_avro(
+        self,
+        shard: Shard,
+        out_filename: str,
+        nr_of_shards: int,
+        avro_options: dict[str, Any],
+    ) -> str:
+        import fastavro
 
-        with open(f"{self.out_filename}.{extension}", "a+b") as outfile:
-            for element in self._elements_to_write:
-                for record_to_write in self._data_generator(element, self._dates):
-                    if len(records_to_write) % BATCH_WRITE_SIZE == 0:
-                        fastavro.writer(outfile, parsed_schema, records_to_write)
-                        records_to_write = []
-                    records_to_write.append(record_to_write)
-            fastavro.writer(outfile, parsed_schema, records_to_write)
+        extension = "avro"
+        part_filename = (
+            f"{out_filename}-{shard[0]:05d}-of-{nr_of_shards:05d}.{extension}"
+        )
+        records_to_write = (
+            record
+            for batch in self._generate_shard_batches(shard)
+            for record in self._batch_as_dicts(batch)
+        )
+
+        with open(part_filename, "wb") as outfile, BackgroundWriter(
+            outfile, self._write_queue_size
+        ) as output:
+            fastavro.writer(
+                cast(BinaryIO, output), records=records_to_write, **avro_options
+            )
+        return part_filename
+
+    def delete_avro_files(self) -> None:
+        extension = "avro"
+        filenames = glob.glob(f"{self.out_filename}-*-of-*.{extension}")
+        filenames.append(f"{self.out_filename}.{extension}")
+        for filename in filenames:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def generate_data_as_avro_parts(
+        self,
+        path_to_schema: str,
+        chunk_size: int = CHUNK_SIZE,
+        nr_of_workers: Optional[int] = None,
+        codec: str = "null",
+        sync_interval: int = AVRO_SYNC_INTERVAL,
+        out_filename: Optional[str] = None,
+    ) -> list[str]:
+        import fastavro
+
+        avro_options = {
+            "schema": fastavro.schema.load_schema(path_to_schema),
+            "codec": codec,
+            "sync_interval": sync_interval,
+        }
+        if out_filename is None:
+            out_filename = self.out_filename
+            if self.appending:
+                out_filename = f"{out_filename}-{self._get_window_name()}"
+            else:
+                self.delete_avro_files()
+        shards = self._get_shards(chunk_size)
+        with self._stage("generate_data_as_avro_parts"):
+            return self._map_shards(
+                "_write_shard_as_avro",
+                shards,
+                nr_of_workers,
+                out_filename,
+                len(shards),
+                avro_options,
+            )
+
+    def generate_data_as_single_avro(
+        self,
+        path_to_schema: str,
+        chunk_size: int = CHUNK_SIZE,
+        nr_of_workers: Optional[int] = None,
+        codec: str = "null",
+        sync_interval: int = AVRO_SYNC_INTERVAL,
+    ) -> None:
+        extension = "avro"
+        if not self.appending:
+            self.delete_avro_files()
+        out_filename = f"{self.out_filename}.{extension}"
+        temp_dir = tempfile.mkdtemp(
+            prefix=".parts-", dir=os.path.dirname(self.out_filename) or "."
+        )
+        try:
+            part_filenames = self.generate_data_as_avro_parts(
+                path_to_schema,
+                chunk_size,
+                nr_of_workers,
+                codec,
+                sync_interval,
+                os.path.join(temp_dir, os.path.basename(self.out_filename)),
+            )
+            with self._stage("concatenate_avro_files") as stage:
+                if part_filenames:
+                    concatenate_avro_files(out_filename, part_filenames, self.appending)
+                elif not self.appending:
+                    write_empty_avro_file(out_filename, path_to_schema, codec)
+                stage["bytes"] += _get_written_bytes(part_filenames)
+        finally:
+            with self._stage("delete_temp_files"):
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _write_shard_as_parquet(
+        self, shard: Shard, out_dir: str, parquet_options: dict[str, Any]
+    ) -> list[str]:
+        import pyarrow
+        import pyarrow.parquet
+
+        extension = "parquet"
+        arrow_schema = parquet_options["schema"]
+        date_fields = parquet_options["date_fields"]
+        tables = []
+        for batch in self._generate_shard_batches(shard):
+            columns = self._batch_as_columns(batch)
+            tables.append(
+                pyarrow.table(
+                    [
+                        pyarrow.array(
+                            _parse_dates(columns[field.name])
+                            if field.name in date_fields
+                            else columns[field.name]
+                        ).cast(field.type)
+                        for field in arrow_schema
+                    ],
+                    schema=arrow_schema,
+                )
+            )
+        if not tables:
+            return []
+        table = pyarrow.concat_tables(tables)
+
+        partition_by = parquet_options["partition_by"]
+        partitions = {"": table}
+        if partition_by == "year":
+            years = table[date_fields[0]].to_numpy().astype("datetime64[Y]").astype(int)
+            partition_keys = years + 1970
+        elif partition_by == "customer_hash":
+            customer_ids = table["customer_id"].to_numpy(zero_copy_only=False)
+            unique_ids, inverse = np.unique(customer_ids, return_inverse=True)
+            nr_of_partitions = parquet_options["nr_of_partitions"]
+            partition_keys = np.array(
+                [
+                    zlib.crc32(customer_id.encode()) % nr_of_partitions
+                    for customer_id in unique_ids
+                ]
+            )[inverse]
+        if partition_by:
+            partitions = {
+                f"{partition_by}={partition_key}": table.filter(
+                    partition_keys == partition_key
+                )
+                for partition_key in np.unique(partition_keys)
+            }
+
+        part_name = f"part-{shard[0]:05d}"
+        if self.appending:
+            part_name = f"part-{self._get_window_name()}-{shard[0]:05d}"
+        part_filenames = []
+        for partition_dir, partition in partitions.items():
+            os.makedirs(os.path.join(out_dir, partition_dir), exist_ok=True)
+            part_filename = os.path.join(
+                out_dir, partition_dir, f"{part_name}.{extension}"
+            )
+            pyarrow.parquet.write_table(
+                partition,
+                part_filename,
+                row_group_size=parquet_options["row_group_size"],
+            )
+            part_filenames.append(part_filename)
+        return part_filenames
+
+    def generate_data_as_parquet(
+        self,
+        path_to_schema: str,
+        date_fields: Sequence[str],
+        chunk_size: int = CHUNK_SIZE,
+        nr_of_workers: Optional[int] = None,
+        row_group_size: int = PARQUET_ROW_GROUP_SIZE,
+        partition_by: Optional[str] = None,
+        nr_of_partitions: int = PARQUET_NR_OF_HASH_PARTITIONS,
+    ) -> list[str]:
+        extension = "parquet"
+        out_dir = f"{self.out_filename}.{extension}"
+        if not self.appending:
+            shutil.rmtree(out_dir, ignore_errors=True)
+        os.makedirs(out_dir, exist_ok=True)
+        with open(path_to_schema) as schema_file:
+            avro_schema = json.load(schema_file)
+        parquet_options = {
+            "schema": _avro_schema_to_arrow(avro_schema, date_fields),
+            "date_fields": date_fields,
+            "row_group_size": row_group_size,
+            "partition_by": partition_by,
+            "nr_of_partitions": nr_of_partitions,
+        }
+        with self._stage("generate_data_as_parquet"):
+            part_filenames = self._map_shards(
+                "_write_shard_as_parquet",
+                self._get_shards(chunk_size),
+                nr_of_workers,
+                out_dir,
+                parquet_options,
+            )
+        return [filename for filenames in part_filenames for filename in filenames]
 
     def delete_temp_files(self, temp_filenames: list[str]) -> None:
-        for filePath in temp_filenames:
-            try:
-                os.remove(filePath)
-            except:
-                print("Error while deleting file : ", filePath)
+        with self._stage("delete_temp_files"):
+            for filePath in temp_filenames:
+                try:
+                    os.remove(filePath)
+                except:
+                    print("Error while deleting file : ", filePath)
+            for temp_dir in {os.path.dirname(filePath) for filePath in temp_filenames}:
+                try:
+                    os.rmdir(temp_dir)
+                except OSError:
+                    print("Error while deleting directory : ", temp_dir)
 
     @staticmethod
-    def parse_arguments() -> tuple[int, int]:
+    def parse_arguments() -> argparse.Namespace:
         parser = argparse.ArgumentParser()
         parser.add_argument(
             "extension",
             type=str,
-            help="Type of output file. Possible values: AVRO, CSV",
-            choices=("csv", "avro"),
+            help="Type of output file. Possible values: AVRO, CSV, PARQUET",
+            choices=("csv", "avro", "parquet"),
+        )
+        parser.add_argument(
+            "--columnar",
+            action="store_true",
+            help="Generate whole batches of customers at once with NumPy",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=None, help="Seed for reproducible output"
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help="Nr of customers generated by a worker into one part file",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Nr of worker processes (default: nr of CPUs)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_WRITE_SIZE,
+            help="Nr of rows formatted and written to a CSV part file at once",
+        )
+        parser.add_argument(
+            "--write-queue-size",
+            type=int,
+            default=0,
+            help="Write batches from a background thread with a queue of N batches "
+            "(2 = double buffering, 0 = write synchronously)",
+        )
+        parser.add_argument(
+            "--compression",
+            type=str,
+            default=None,
+            choices=tuple(CSV_COMPRESSIONS),
+            help="Compress CSV part files as gzip members or zstd frames (zstd needs zstandard)",
+        )
+        parser.add_argument(
+            "--codec",
+            type=str,
+            default="null",
+            choices=AVRO_CODECS,
+            help="Avro block compression codec (snappy and zstandard need extra libraries)",
+        )
+        parser.add_argument(
+            "--sync-interval",
+            type=int,
+            default=AVRO_SYNC_INTERVAL,
+            help="Approximate size in bytes of an Avro block",
+        )
+        parser.add_argument(
+            "--single-file",
+            action="store_true",
+            help="Concatenate Avro part files into one container file",
+        )
+        parser.add_argument(
+            "--row-group-size",
+            type=int,
+            default=PARQUET_ROW_GROUP_SIZE,
+            help="Max nr of rows in a Parquet row group",
+        )
+        parser.add_argument(
+            "--partition-by",
+            type=str,
+            default=None,
+            choices=PARQUET_PARTITIONINGS,
+            help="Partition Parquet output by year or by customer_id hash",
+        )
+        parser.add_argument(
+            "--nr-of-partitions",
+            type=int,
+            default=PARQUET_NR_OF_HASH_PARTITIONS,
+            help="Nr of customer_id hash partitions",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            action="store_true",
+            help="Save the generator state of every customer for --append-months",
+        )
+        parser.add_argument(
+            "--append-months",
+            type=int,
+            default=None,
+            help="Append N months after the last checkpointed one to existing output",
+        )
+        parser.add_argument(
+            "--progress",
+            action="store_true",
+            help="Print a live progress line for every stage to stderr",
+        )
+        parser.add_argument(
+            "--metrics",
+            type=str,
+            default=None,
+            help="Dump stage and worker metrics as JSON (or Prometheus text for .prom)",
         )
-        args = parser.parse_args()
-        return args.extension
+        return parser.parse_args()
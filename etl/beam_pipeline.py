@@ -1,77 +1,210 @@
-from datetime import datetime
+import argparse
+import json
 from typing import (
+    Any,
     Dict,
     Iterable,
+    List,
+    NamedTuple,
+    Optional,
     Tuple,
     Union
 )
 
 import apache_beam as beam
+from apache_beam.metrics import Metrics
+from apache_beam.metrics.metric import MetricsFilter
+from apache_beam.options.pipeline_options import PipelineOptions
 
-HEADERS = ("customer_id", "cause-points", "total points")
+from date_codec import (
+    DATES_FILENAME,
+    decode_date,
+    load_date_lookup,
+    to_month_key,
+    to_ordinal
+)
+from input_files import find_input_file
+from scoring_common import (
+    CAUSES,
+    HEADERS,
+    MONTHLY_SPEND_COLUMNS,
+    OUTPUT_FILE_PATH_PREFIX
+)
 
+JOIN_MODES = ("cogroup", "side_input", "sorted_merge")
+INPUT_FORMATS = ("csv", "avro", "parquet")
+INPUT_FOLDER = "../data_generators/output"
+INPUT_FILE_PATTERNS = {
+    "csv": "{name}.csv",
+    "avro": "{name}-*-of-*.avro",
+    "parquet": "{name}.parquet/**.parquet",
+}
+AVRO_SINGLE_FILE_PATTERN = "{name}.avro"
+RECORD_LOANS_COLUMNS = (
+    "customer_id",
+    "due_amount_in_usd",
+    "due_date",
+    "payment_date",
+    "payment_amount",
+)
 
-def get_sum_due_and_payment_amount(
-    values: Tuple[int, int],
-) -> Tuple[int, int]:
-    paid_amount, loan_amount = 0, 0
-    for row in values:
-        paid_amount += row[0]
-        loan_amount += row[1]
-    return paid_amount, loan_amount
+MonthKey = Tuple[str, int]
+PROMETHEUS_EXTENSION = "prom"
 
+METRICS_NAMESPACE = "beam_pipeline"
+PARSED_LOANS = Metrics.counter(METRICS_NAMESPACE, "parsed_loans")
+PARSED_MONTHLY_SPEND = Metrics.counter(METRICS_NAMESPACE, "parsed_monthly_spend")
+CUSTOMERS_WITH_LOANS = Metrics.counter(METRICS_NAMESPACE, "customers_with_loans")
+NOT_FULL_PAID_CUSTOMERS = Metrics.counter(METRICS_NAMESPACE, "not_full_paid_customers")
+SCORED_CUSTOMERS = Metrics.counter(METRICS_NAMESPACE, "scored_customers")
+LATE_PAYMENTS = Metrics.distribution(METRICS_NAMESPACE, "late_payments")
+NOT_FULL_PAID_MONTHS = Metrics.distribution(METRICS_NAMESPACE, "not_full_paid_months")
+TOTAL_POINTS = Metrics.distribution(METRICS_NAMESPACE, "total_points")
 
-def count_points_for_not_paid_loan(
-    row: Tuple[str, Tuple[int, int]],
-) -> Tuple[str, int]:
-    points = 0
-    balance_amount = row[1][1] - row[1][0]
-    if balance_amount > 0:
-        points += 3
-    return row[0], points
 
+class Loan(NamedTuple):
+    customer_id: str
+    due_amount_in_usd: int
+    payment_amount_in_usd: int
+    due_date: int
+    payment_date: int
+    due_month: int
 
-def count_points_for_lack_of_payments(
-    row: Tuple[str, Iterable[int]]
-) -> Tuple[str, int]:
-    points = 0
-    key, values = row[0], row[1]
-    if len(values) > 2:
-        points = 1
-    return key, points
+
+beam.coders.registry.register_coder(Loan, beam.coders.RowCoder)
+
+
+def parse_loan(row: List[str]) -> Loan:
+    due_date, due_month = decode_date(row[7])
+    PARSED_LOANS.inc()
+    return Loan(
+        customer_id=row[0],
+        due_amount_in_usd=int(row[6]),
+        payment_amount_in_usd=int(row[9]),
+        due_date=due_date,
+        payment_date=to_ordinal(row[8]),
+        due_month=due_month,
+    )
+
+
+def parse_loan_record(record: Dict[str, Any]) -> Loan:
+    due_date, due_month = decode_date(record["due_date"])
+    PARSED_LOANS.inc()
+    return Loan(
+        customer_id=record["customer_id"],
+        due_amount_in_usd=record["due_amount_in_usd"],
+        payment_amount_in_usd=record["payment_amount"],
+        due_date=due_date,
+        payment_date=to_ordinal(record["payment_date"]),
+        due_month=due_month,
+    )
 
 
-def count_points_for_late_payment(
-    row: Iterable[str],
-) -> Iterable[Union[str, int]]:
-    raw_due_date, raw_payment_date = row[7], row[8]
-    due_date_to_compare = datetime.strptime(raw_due_date, "%d-%m-%Y")
-    payment_date_to_compare = datetime.strptime(raw_payment_date, "%d-%m-%Y")
-    if payment_date_to_compare <= due_date_to_compare:
-        row.append(0)
-    else:
-        row.append(1)
-    return row
+class LoanPointsCombineFn(beam.CombineFn):
+    def create_accumulator(self) -> List[int]:
+        due_amount, paid_amount, skipped_payments, late_payments = 0, 0, 0, 0
+        return [due_amount, paid_amount, skipped_payments, late_payments]
+
+    def add_input(self, accumulator: List[int], loan: Loan) -> List[int]:
+        accumulator[0] += loan.due_amount_in_usd
+        accumulator[1] += loan.payment_amount_in_usd
+        accumulator[2] += loan.payment_amount_in_usd == 0
+        accumulator[3] += loan.payment_date > loan.due_date
+        return accumulator
+
+    def merge_accumulators(self, accumulators: Iterable[List[int]]) -> List[int]:
+        merged = self.create_accumulator()
+        for accumulator in accumulators:
+            for index, value in enumerate(accumulator):
+                merged[index] += value
+        return merged
+
+    def extract_output(self, accumulator: List[int]) -> Tuple[int, int, int]:
+        due_amount, paid_amount, skipped_payments, late_payments = accumulator
+        debtor_points = 3 if paid_amount - due_amount > 0 else 0
+        skipper_points = 1 if skipped_payments > 2 else 0
+        CUSTOMERS_WITH_LOANS.inc()
+        LATE_PAYMENTS.update(late_payments)
+        return debtor_points, skipper_points, late_payments
+
+
+class PointsVectorCombineFn(beam.CombineFn):
+    def create_accumulator(self) -> List[int]:
+        return [0] * len(CAUSES)
+
+    def add_input(
+        self, accumulator: List[int], points_vector: Tuple[int, ...]
+    ) -> List[int]:
+        for index, points in enumerate(points_vector):
+            accumulator[index] += points
+        return accumulator
+
+    def merge_accumulators(self, accumulators: Iterable[List[int]]) -> List[int]:
+        merged = self.create_accumulator()
+        for accumulator in accumulators:
+            self.add_input(merged, accumulator)
+        return merged
+
+    def extract_output(self, accumulator: List[int]) -> Tuple[int, ...]:
+        return tuple(accumulator)
 
 
 def filter_where_available_money_is_higher_than_due_amount(
-    row: Tuple[str, Dict[str, Iterable[str]]]
-) -> Tuple[str, Dict[str, Iterable[str]]]:
-    loan_amount = row[1]["loans"]
-    available_amount = row[1]["available money"][0]
-    if loan_amount and (int(loan_amount[0]) < int(available_amount)):
-        return row
+    row: Tuple[MonthKey, Dict[str, Iterable[int]]]
+) -> bool:
+    payment_amounts = row[1]["loans"]
+    available_amounts = list(row[1]["available money"])
+    return bool(available_amounts) and any(
+        payment_amount < available_amounts[0] for payment_amount in payment_amounts
+    )
+
+
+def find_payment_lower_than_available_money(
+    row: Tuple[MonthKey, int], available_money: Dict[MonthKey, int]
+) -> Iterable[MonthKey]:
+    key, payment_amount = row
+    if key in available_money and payment_amount < available_money[key]:
+        yield key
+
+
+def merge_months_with_payment_lower_than_available_money(
+    row: Tuple[str, Dict[str, Iterable[Tuple[int, int]]]]
+) -> Iterable[str]:
+    customer_id, grouped = row
+    payments = sorted(grouped["loans"])
+    available_money = sorted(grouped["available money"])
+    available_money_index = 0
+    last_month = None
+    for month, payment_amount in payments:
+        while (
+            available_money_index < len(available_money)
+            and available_money[available_money_index][0] < month
+        ):
+            available_money_index += 1
+        if available_money_index == len(available_money):
+            break
+        available_month, available_amount = available_money[available_money_index]
+        if (
+            month == available_month
+            and month != last_month
+            and payment_amount < available_amount
+        ):
+            last_month = month
+            yield customer_id
 
 
 def prepare_row_key_with_month(
     row: Iterable[str], date_index: int, amount_index: int
-) -> Tuple[str, str]:
+) -> Tuple[MonthKey, int]:
     raw_date, amount = row[date_index], row[amount_index]
-    date_to_compare = datetime.strptime(raw_date, "%d-%m-%Y")
-    date_without_day = datetime(
-        date_to_compare.year, date_to_compare.month, 1
-    ).strftime("%m%Y")
-    return f"{row[0]}/{date_without_day}", amount
+    PARSED_MONTHLY_SPEND.inc()
+    return (row[0], to_month_key(raw_date)), int(amount)
+
+
+def prepare_record_key_with_month(record: Dict[str, Any]) -> Tuple[MonthKey, int]:
+    PARSED_MONTHLY_SPEND.inc()
+    key = record["customer_id"], to_month_key(record["month"])
+    return key, record["available_money_in_usd"]
 
 
 def count_points_for_lack_of_full_amount_payment_on_account_available_money(
@@ -79,28 +212,70 @@ def count_points_for_lack_of_full_amount_payment_on_account_available_money(
 ) -> Tuple[str, int]:
     key, value = row
     points = value // 3
+    NOT_FULL_PAID_CUSTOMERS.inc()
+    NOT_FULL_PAID_MONTHS.update(value)
     return key, points
 
 
 def format_output(
-    row: Tuple[Union[str, int], ...], cause: str
-) -> Tuple[Union[str, int], ...]:
-    key, value = row
-    return key, value, cause
+    row: Tuple[str, Union[int, Tuple[int, ...]]], causes: Tuple[str, ...]
+) -> Tuple[str, Tuple[int, ...]]:
+    key, values = row
+    if not isinstance(values, tuple):
+        values = (values,)
+    points_vector = [0] * len(CAUSES)
+    for cause, points in zip(causes, values):
+        points_vector[CAUSES.index(cause)] = points
+    return key, tuple(points_vector)
 
 
-def summarize_output(
-    row: Tuple[Union[int, str], Iterable[Tuple[Union[int, str], ...]]]
-) -> Tuple[str, int]:
-    key, values = row
-    output = f"{key}, "
-    total_points = 0
-    for value in values:
-        points, cause = value
-        if points:
-            output += f"{cause}-{points} "
-            total_points += points
-    return f"{output}, {total_points}", total_points
+def summarize_output(row: Tuple[str, Tuple[int, ...]]) -> str:
+    key, points_vector = row
+    SCORED_CUSTOMERS.inc()
+    TOTAL_POINTS.update(sum(points_vector))
+    cause_points = "".join(
+        f"{cause}-{points} " for cause, points in zip(CAUSES, points_vector) if points
+    )
+    return f"{key}, {cause_points}, {sum(points_vector)}"
+
+
+class CountMonthsWithPaymentLowerThanAvailableMoney(beam.PTransform):
+    def __init__(self, join_mode: str = "cogroup") -> None:
+        super().__init__()
+        self._join_mode = join_mode
+
+    def expand(self, pcolls) -> beam.pvalue.PCollection[str]:
+        if self._join_mode == "side_input":
+            return (
+                pcolls["loans"]
+                | "Look up available money in the same month"
+                >> beam.FlatMap(
+                    find_payment_lower_than_available_money,
+                    available_money=beam.pvalue.AsDict(pcolls["available money"]),
+                )
+                | "Distinct months" >> beam.Distinct()
+                | "Remove month from key" >> beam.Map(lambda key: key[0])
+            )
+        if self._join_mode == "sorted_merge":
+            return (
+                {
+                    name: pcoll
+                    | f"id: month, {name}"
+                    >> beam.Map(lambda row: (row[0][0], (row[0][1], row[1])))
+                    for name, pcoll in pcolls.items()
+                }
+                | "Group months per customer" >> beam.CoGroupByKey()
+                | "Merge sorted months"
+                >> beam.FlatMap(merge_months_with_payment_lower_than_available_money)
+            )
+        return (
+            pcolls
+            | "Group not full paid loans despite available money per month"
+            >> beam.CoGroupByKey()
+            | "Filter entries where available money is higher than due amount"
+            >> beam.Filter(filter_where_available_money_is_higher_than_due_amount)
+            | "Remove month from key" >> beam.Map(lambda row: row[0][0])
+        )
 
 
 class SplitEveryRow(beam.PTransform):
@@ -115,107 +290,294 @@ class SplitEveryRow(beam.PTransform):
         return output
 
 
-def run_pipeline():
-    with beam.Pipeline() as pipe:
-        loans_input_splitted = (
-            pipe
-            | "Read loans data"
-            >> beam.io.ReadFromText(
-                "../data_generators/output/loans.csv", skip_header_lines=1
+def get_input_path(name: str, input_format: str, avro_single_file: bool = False) -> str:
+    file_pattern = INPUT_FILE_PATTERNS[input_format]
+    if input_format == "avro" and avro_single_file:
+        file_pattern = AVRO_SINGLE_FILE_PATTERN
+    file_pattern = file_pattern.format(name=name)
+    path = f"{INPUT_FOLDER}/{file_pattern}"
+    if input_format == "csv":
+        return find_input_file(path)
+    return path
+
+
+class ReadRecords(beam.PTransform):
+    def __init__(
+        self, input_format: str, file_pattern: str, columns: Tuple[str, ...]
+    ) -> None:
+        super().__init__()
+        self._input_format = input_format
+        self._file_pattern = file_pattern
+        self._columns = columns
+
+    def expand(
+        self, pipe: beam.pvalue.PBegin
+    ) -> beam.pvalue.PCollection[Dict[str, Any]]:
+        if self._input_format == "avro":
+            return pipe | "Read Avro" >> beam.io.ReadFromAvro(self._file_pattern)
+        return pipe | "Read Parquet" >> beam.io.ReadFromParquet(
+            self._file_pattern, columns=list(self._columns)
+        )
+
+
+class ReadLoans(beam.PTransform):
+    def __init__(self, input_format: str, file_pattern: str) -> None:
+        super().__init__()
+        self._input_format = input_format
+        self._file_pattern = file_pattern
+
+    def expand(self, pipe: beam.pvalue.PBegin) -> beam.pvalue.PCollection[Loan]:
+        if self._input_format == "csv":
+            return (
+                pipe
+                | "Read loans data"
+                >> beam.io.ReadFromText(self._file_pattern, skip_header_lines=1)
+                | "Split loans data" >> SplitEveryRow()
+                | "Parse loans" >> beam.Map(parse_loan).with_output_types(Loan)
             )
-            | "Split loans data" >> SplitEveryRow()
+        return (
+            pipe
+            | "Read loan records"
+            >> ReadRecords(self._input_format, self._file_pattern, RECORD_LOANS_COLUMNS)
+            | "Parse loan records"
+            >> beam.Map(parse_loan_record).with_output_types(Loan)
         )
-        monthly_spend_splitted = (
+
+
+class ReadAvailableMoney(beam.PTransform):
+    def __init__(self, input_format: str, file_pattern: str) -> None:
+        super().__init__()
+        self._input_format = input_format
+        self._file_pattern = file_pattern
+
+    def expand(
+        self, pipe: beam.pvalue.PBegin
+    ) -> beam.pvalue.PCollection[Tuple[MonthKey, int]]:
+        if self._input_format == "csv":
+            return (
+                pipe
+                | "Read monthly spend data"
+                >> beam.io.ReadFromText(self._file_pattern, skip_header_lines=1)
+                | "Split monthly spend data" >> SplitEveryRow()
+                | "(id, month): available money"
+                >> beam.Map(prepare_row_key_with_month, date_index=7, amount_index=6)
+            )
+        return (
             pipe
-            | "Read monthly spend data"
-            >> beam.io.ReadFromText(
-                "../data_generators/output/monthly_spend.csv", skip_header_lines=1
+            | "Read monthly spend records"
+            >> ReadRecords(
+                self._input_format, self._file_pattern, MONTHLY_SPEND_COLUMNS
             )
-            | "Split monthly spend data" >> SplitEveryRow()
-        )
-        loan_debtor = (
-            loans_input_splitted
-            | "id: due_amount_in_usd, payment_amount_in_usd"
-            >> beam.Map(lambda row: (f"{row[0]}", (int(row[6]), int(row[9]))))
-            | "Get sum of due and payment amounts"
-            >> beam.CombinePerKey(get_sum_due_and_payment_amount)
-            | "Count points for not fully paid loans"
-            >> beam.Map(count_points_for_not_paid_loan)
-            | "Prepare output for loan debtor"
-            >> beam.Map(format_output, cause="debtor")
-        )
-        loan_skippers = (
-            loans_input_splitted
-            | "Filter where payment_amount_in_usd is 0"
-            >> beam.Filter(lambda row: row[9] == "0")
-            | "id: 1" >> beam.Map(lambda row: (f"{row[0]}", 1))
-            | "Group amount of skipped payments" >> beam.GroupByKey()
-            | "Count points for lack of payments"
-            >> beam.Map(count_points_for_lack_of_payments)
-            | "Prepare output for loan skippers"
-            >> beam.Map(format_output, cause="skipper")
-        )
-        loan_late_payments = (
-            loans_input_splitted
-            | "Count points for too late payments"
-            >> beam.Map(count_points_for_late_payment)
-            | "id: point" >> beam.Map(lambda row: (row[0], row[10]))
-            | "Sum late payments" >> beam.CombinePerKey(sum)
-            | "Prepare output for late payment"
-            >> beam.Map(format_output, cause="late payment")
+            | "(id, month): available money" >> beam.Map(prepare_record_key_with_month)
+        )
+
+
+class ScoringOptions(PipelineOptions):
+    @classmethod
+    def _add_argparse_args(cls, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument(
+            "--input-format",
+            type=str,
+            default="csv",
+            choices=INPUT_FORMATS,
+            help="Format of the generated loans and monthly spend data",
+        )
+        parser.add_argument(
+            "--avro-single-file",
+            action="store_true",
+            help="Read <name>.avro written with --single-file instead of the parts",
+        )
+        parser.add_argument(
+            "--loans",
+            type=str,
+            default=None,
+            help="Path or glob of loans files (default: generator output for the format)",
+        )
+        parser.add_argument(
+            "--monthly-spend",
+            type=str,
+            default=None,
+            help="Path or glob of monthly spend files",
+        )
+        parser.add_argument(
+            "--dates",
+            type=str,
+            default=DATES_FILENAME,
+            help="dates.txt used to precompute the date lookup table",
+        )
+        parser.add_argument(
+            "--output",
+            type=str,
+            default=OUTPUT_FILE_PATH_PREFIX,
+            help="Path prefix of the output files",
+        )
+        parser.add_argument(
+            "--num-shards",
+            type=int,
+            default=0,
+            help="Nr of output files (0 lets the runner decide)",
+        )
+        parser.add_argument(
+            "--join-mode",
+            type=str,
+            default="sorted_merge",
+            choices=JOIN_MODES,
+            help="How not full paid loans are joined with available money",
+        )
+        parser.add_argument(
+            "--metrics",
+            type=str,
+            default=None,
+            help="Dump Beam metrics as JSON (or Prometheus text for .prom)",
+        )
+
+
+def _get_metric_result(metric: Any) -> Any:
+    if metric.committed is not None:
+        return metric.committed
+    return metric.attempted
+
+
+def query_metrics(result: beam.runners.runner.PipelineResult) -> Dict[str, Any]:
+    metrics = result.metrics().query(MetricsFilter().with_namespace(METRICS_NAMESPACE))
+    distributions = {
+        distribution.key.metric.name: _get_metric_result(distribution)
+        for distribution in metrics["distributions"]
+    }
+    return {
+        "counters": {
+            counter.key.metric.name: _get_metric_result(counter)
+            for counter in metrics["counters"]
+        },
+        "distributions": {
+            name: {
+                "count": distribution.count,
+                "sum": distribution.sum,
+                "min": distribution.min,
+                "max": distribution.max,
+                "mean": distribution.mean,
+            }
+            for name, distribution in distributions.items()
+        },
+    }
+
+
+def dump_metrics(metrics: Dict[str, Any], filename: str) -> None:
+    with open(filename, "w") as file:
+        if not filename.endswith(PROMETHEUS_EXTENSION):
+            json.dump(metrics, file, indent=2)
+            return
+        for name, value in metrics["counters"].items():
+            file.write(f"# TYPE {METRICS_NAMESPACE}_{name} counter\n")
+            file.write(f"{METRICS_NAMESPACE}_{name} {value}\n")
+        for name, distribution in metrics["distributions"].items():
+            file.write(f"# TYPE {METRICS_NAMESPACE}_{name} summary\n")
+            file.write(f"{METRICS_NAMESPACE}_{name}_count {distribution['count']}\n")
+            file.write(f"{METRICS_NAMESPACE}_{name}_sum {distribution['sum']}\n")
+
+
+def run_pipeline(
+    join_mode: str = "sorted_merge",
+    metrics_filename: Optional[str] = None,
+    dates_filename: str = DATES_FILENAME,
+    input_format: str = "csv",
+    loans_path: Optional[str] = None,
+    monthly_spend_path: Optional[str] = None,
+    output_path: str = OUTPUT_FILE_PATH_PREFIX,
+    num_shards: int = 0,
+    avro_single_file: bool = False,
+    pipeline_options: Optional[PipelineOptions] = None,
+) -> Dict[str, Any]:
+    load_date_lookup(dates_filename)
+    if loans_path is None:
+        loans_path = get_input_path("loans", input_format, avro_single_file)
+    if monthly_spend_path is None:
+        monthly_spend_path = get_input_path(
+            "monthly_spend", input_format, avro_single_file
+        )
+    with beam.Pipeline(options=pipeline_options) as pipe:
+        loans = pipe | "Read loans" >> ReadLoans(input_format, loans_path)
+        loan_points = (
+            loans
+            | "id: loan" >> beam.Map(lambda loan: (loan.customer_id, loan))
+            | "Count debtor, skipper and late payment points"
+            >> beam.CombinePerKey(LoanPointsCombineFn())
+            | "Prepare output for loan points"
+            >> beam.Map(format_output, causes=("debtor", "skipper", "late payment"))
         )
         not_full_paid_loans = (
-            loans_input_splitted
+            loans
             | "Filter not full paid loans"
-            >> beam.Filter(lambda row: int(row[9]) < int(row[6]))
-            | "id/date: payment"
-            >> beam.Map(prepare_row_key_with_month, date_index=7, amount_index=9)
+            >> beam.Filter(
+                lambda loan: loan.payment_amount_in_usd < loan.due_amount_in_usd
+            )
+            | "(id, month): payment"
+            >> beam.Map(
+                lambda loan: (
+                    (loan.customer_id, loan.due_month),
+                    loan.payment_amount_in_usd,
+                )
+            )
         )
         available_money_in_each_month = (
-            monthly_spend_splitted
-            | "id/date: available money"
-            >> beam.Map(prepare_row_key_with_month, date_index=7, amount_index=6)
+            pipe
+            | "Read available money"
+            >> ReadAvailableMoney(input_format, monthly_spend_path)
         )
         loan_lack_of_full_amount_payment_but_on_account_available_money = (
             {
                 "loans": not_full_paid_loans,
                 "available money": available_money_in_each_month,
             }
-            | "Group not full paid loans despite available money per month"
-            >> beam.CoGroupByKey()
-            | "Filter entries where available money is higher than due amount"
-            >> beam.Filter(filter_where_available_money_is_higher_than_due_amount)
-            | "Remove month from key; id1: 1"
-            >> beam.Map(lambda row: (row[0].split("/")[0], 1))
-            | "Sum not full paid loans" >> beam.CombinePerKey(sum)
+            | "Join not full paid loans with available money per month"
+            >> CountMonthsWithPaymentLowerThanAvailableMoney(join_mode)
+            | "Count not full paid loans" >> beam.combiners.Count.PerElement()
             | "Count points for lack of full payment where has enough money"
             >> beam.Map(
                 count_points_for_lack_of_full_amount_payment_on_account_available_money
             )
             | "Prepare output for not full paid loan"
-            >> beam.Map(format_output, cause="not full paid")
+            >> beam.Map(format_output, causes=("not full paid",))
         )
         final_output = (
             (
-                loan_debtor,
-                loan_skippers,
-                loan_late_payments,
+                loan_points,
                 loan_lack_of_full_amount_payment_but_on_account_available_money,
             )
             | "Merge PCollections" >> beam.Flatten()
-            | "id: points, cause" >> beam.Map(lambda row: (row[0], row[1:]))
-            | "Group points and causes" >> beam.GroupByKey()
+            | "Sum points vectors" >> beam.CombinePerKey(PointsVectorCombineFn())
+            | "Filter id where exists any point"
+            >> beam.Filter(lambda row: sum(row[1]) > 0)
             | "Final output" >> beam.Map(summarize_output)
-            | "Filter id where exists any point" >> beam.Filter(lambda row: row[1] > 0)
-            | "Get final output" >> beam.Map(lambda row: row[0])
             | "Write output to a file"
             >> beam.io.WriteToText(
-                file_path_prefix="outputs/final",
+                file_path_prefix=output_path,
                 file_name_suffix=".csv",
+                num_shards=num_shards,
                 header=", ".join(HEADERS),
             )
         )
 
+    metrics = query_metrics(pipe.result)
+    if metrics_filename:
+        dump_metrics(metrics, metrics_filename)
+    return metrics
+
 
 if __name__ == "__main__":
-    run_pipeline()
+    pipeline_options = PipelineOptions()
+    options = pipeline_options.view_as(ScoringOptions)
+    metrics = run_pipeline(
+        options.join_mode,
+        options.metrics,
+        options.dates,
+        options.input_format,
+        options.loans,
+        options.monthly_spend,
+        options.output,
+        options.num_shards,
+        options.avro_single_file,
+        pipeline_options,
+    )
+    if options.metrics:
+        print(json.dumps(metrics, indent=2))
@@ -0,0 +1,66 @@
+import calendar
+import functools
+import os
+from datetime import (
+    date,
+    datetime
+)
+from typing import Union
+
+DATE_FORMAT = "%d-%m-%Y"
+DATES_FILENAME = "../data_generators/output/dates.txt"
+DATE_CACHE_SIZE = 65536
+
+DecodedDate = tuple[int, int]
+
+_date_lookup: dict[str, DecodedDate] = {}
+
+
+def get_month_key(month_date: date) -> int:
+    return month_date.year * 100 + month_date.month
+
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def _parse_date(raw_date: str) -> DecodedDate:
+    parsed_date = datetime.strptime(raw_date, DATE_FORMAT)
+    return parsed_date.toordinal(), get_month_key(parsed_date)
+
+
+def build_date_lookup(dates_filename: str = DATES_FILENAME) -> dict[str, DecodedDate]:
+    lookup = {}
+    with open(dates_filename) as file:
+        for row in file:
+            if not row.strip():
+                continue
+            first_day = datetime.strptime(row.strip(), DATE_FORMAT).date()
+            month_suffix = first_day.strftime("-%m-%Y")
+            month_key = get_month_key(first_day)
+            _, nr_of_days = calendar.monthrange(first_day.year, first_day.month)
+            for day in range(1, nr_of_days + 1):
+                decoded_date = first_day.toordinal() + day - 1, month_key
+                lookup[f"{day}{month_suffix}"] = decoded_date
+                lookup[f"{day:02d}{month_suffix}"] = decoded_date
+    return lookup
+
+
+def load_date_lookup(dates_filename: str = DATES_FILENAME) -> None:
+    global _date_lookup
+    if os.path.exists(dates_filename):
+        _date_lookup = build_date_lookup(dates_filename)
+
+
+def decode_date(raw_date: Union[str, date]) -> DecodedDate:
+    decoded_date = _date_lookup.get(raw_date)
+    if decoded_date is not None:
+        return decoded_date
+    if isinstance(raw_date, date):
+        return raw_date.toordinal(), get_month_key(raw_date)
+    return _parse_date(raw_date)
+
+
+def to_ordinal(raw_date: Union[str, date]) -> int:
+    return decode_date(raw_date)[0]
+
+
+def to_month_key(raw_date: Union[str, date]) -> int:
+    return decode_date(raw_date)[1]
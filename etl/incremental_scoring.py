@@ -0,0 +1,214 @@
+import argparse
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from date_codec import (
+    DATES_FILENAME,
+    load_date_lookup
+)
+from input_files import (
+    find_input_file,
+    open_input_file
+)
+from pandas_scoring import (
+    ACCUMULATORS,
+    count_accumulators,
+    count_points_from_accumulators,
+    get_month_keys,
+    read_csv,
+    summarize_output
+)
+from scoring_common import (
+    LOANS_COLUMNS,
+    LOANS_FILENAME,
+    MONTHLY_SPEND_COLUMNS,
+    MONTHLY_SPEND_FILENAME,
+    OUTPUT_FILE_PATH_PREFIX,
+    write_output
+)
+
+STATE_FILENAME = "outputs/state.sqlite"
+READ_CHUNK_SIZE = 1_000_000
+INITIAL_WATERMARK = 0
+
+
+def read_header(filename: str) -> list[str]:
+    with open_input_file(filename) as file:
+        return [column.strip() for column in next(file).split(",")]
+
+
+def read_csv_after_offset(
+    filename: str,
+    columns: tuple[str, ...],
+    offset: int,
+    customer_id_dtype: str = "str",
+) -> tuple[pd.DataFrame, int]:
+    filename = find_input_file(filename)
+    end_offset = os.path.getsize(filename)
+    if end_offset < offset:
+        raise ValueError(
+            f"{filename} is shorter than at the previous run, "
+            "remove the state file to score it from the beginning"
+        )
+    if end_offset == offset:
+        return pd.DataFrame(columns=list(columns)), end_offset
+    header = read_header(filename)
+    with open_input_file(filename, offset) as file:
+        if not offset:
+            next(file)
+        chunks = read_csv(file, columns, customer_id_dtype, READ_CHUNK_SIZE, header)
+        new_rows_df = pd.concat(list(chunks), ignore_index=True)
+    return new_rows_df, end_offset
+
+
+def get_new_watermark(
+    watermark: int, loans_month_keys: np.ndarray, spend_month_keys: np.ndarray
+) -> int:
+    for name, month_keys in (
+        ("loans", loans_month_keys),
+        ("monthly spend", spend_month_keys),
+    ):
+        if (month_keys <= watermark).any():
+            raise ValueError(
+                f"New {name} rows are from months up to {watermark} that were "
+                "already scored, remove the state file to score from the beginning"
+            )
+    last_loans_month = int(loans_month_keys.max(initial=watermark))
+    last_spend_month = int(spend_month_keys.max(initial=watermark))
+    if last_loans_month != last_spend_month:
+        raise ValueError(
+            f"Loans reach month {last_loans_month} and monthly spend month "
+            f"{last_spend_month}, append the same months to both inputs "
+            "before scoring"
+        )
+    return last_loans_month
+
+
+def open_state(filename: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(filename)
+    accumulator_columns = ", ".join(f"{name} INTEGER NOT NULL" for name in ACCUMULATORS)
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS customer_accumulators "
+        f"(customer_id TEXT PRIMARY KEY, {accumulator_columns})"
+    )
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS watermark "
+        "(id INTEGER PRIMARY KEY CHECK (id = 0), month_key INTEGER NOT NULL)"
+    )
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS input_offsets "
+        "(name TEXT PRIMARY KEY, byte_offset INTEGER NOT NULL)"
+    )
+    return connection
+
+
+def read_watermark(connection: sqlite3.Connection) -> int:
+    row = connection.execute("SELECT month_key FROM watermark").fetchone()
+    return row[0] if row else INITIAL_WATERMARK
+
+
+def read_offset(connection: sqlite3.Connection, name: str) -> int:
+    row = connection.execute(
+        "SELECT byte_offset FROM input_offsets WHERE name = ?", (name,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def read_accumulators(connection: sqlite3.Connection) -> pd.DataFrame:
+    return pd.read_sql_query(
+        "SELECT * FROM customer_accumulators", connection, index_col="customer_id"
+    )
+
+
+def merge_accumulators(
+    connection: sqlite3.Connection,
+    accumulators_df: pd.DataFrame,
+    watermark: int,
+    offsets: dict[str, int],
+) -> None:
+    columns = ", ".join(ACCUMULATORS)
+    placeholders = ", ".join("?" * (len(ACCUMULATORS) + 1))
+    updates = ", ".join(f"{name} = {name} + excluded.{name}" for name in ACCUMULATORS)
+    rows = zip(
+        accumulators_df.index,
+        *(accumulators_df[name].tolist() for name in ACCUMULATORS),
+    )
+    with connection:
+        connection.executemany(
+            f"INSERT INTO customer_accumulators (customer_id, {columns}) "
+            f"VALUES ({placeholders}) "
+            f"ON CONFLICT(customer_id) DO UPDATE SET {updates}",
+            rows,
+        )
+        connection.execute(
+            "INSERT INTO watermark (id, month_key) VALUES (0, ?) "
+            "ON CONFLICT(id) DO UPDATE SET month_key = excluded.month_key",
+            (watermark,),
+        )
+        connection.executemany(
+            "INSERT INTO input_offsets (name, byte_offset) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET byte_offset = excluded.byte_offset",
+            offsets.items(),
+        )
+
+
+def run_incremental_scoring(
+    loans_filename: str = LOANS_FILENAME,
+    monthly_spend_filename: str = MONTHLY_SPEND_FILENAME,
+    state_filename: str = STATE_FILENAME,
+    file_path_prefix: str = OUTPUT_FILE_PATH_PREFIX,
+    dates_filename: str = DATES_FILENAME,
+) -> str:
+    load_date_lookup(dates_filename)
+    connection = open_state(state_filename)
+    try:
+        watermark = read_watermark(connection)
+        loans_df, loans_offset = read_csv_after_offset(
+            loans_filename, LOANS_COLUMNS, read_offset(connection, "loans")
+        )
+        spend_df, spend_offset = read_csv_after_offset(
+            monthly_spend_filename,
+            MONTHLY_SPEND_COLUMNS,
+            read_offset(connection, "monthly_spend"),
+            "category",
+        )
+        new_watermark = get_new_watermark(
+            watermark,
+            get_month_keys(loans_df["due_date"]),
+            get_month_keys(spend_df["month"]),
+        )
+        offsets = {"loans": loans_offset, "monthly_spend": spend_offset}
+        if loans_df.empty:
+            accumulators_df = pd.DataFrame(columns=list(ACCUMULATORS))
+        else:
+            accumulators_df = count_accumulators(loans_df, spend_df)
+        merge_accumulators(connection, accumulators_df, new_watermark, offsets)
+        points_df = count_points_from_accumulators(read_accumulators(connection))
+    finally:
+        connection.close()
+    return write_output(summarize_output(points_df), file_path_prefix)
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--loans", type=str, default=LOANS_FILENAME)
+    parser.add_argument("--monthly-spend", type=str, default=MONTHLY_SPEND_FILENAME)
+    parser.add_argument(
+        "--state",
+        type=str,
+        default=STATE_FILENAME,
+        help="SQLite file with per-customer accumulators and the month watermark",
+    )
+    parser.add_argument("--output", type=str, default=OUTPUT_FILE_PATH_PREFIX)
+    parser.add_argument("--dates", type=str, default=DATES_FILENAME)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    run_incremental_scoring(
+        args.loans, args.monthly_spend, args.state, args.output, args.dates
+    )
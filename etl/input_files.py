@@ -0,0 +1,44 @@
+import contextlib
+import gzip
+import io
+import os
+from typing import (
+    Iterator,
+    TextIO
+)
+
+COMPRESSED_CSV_EXTENSIONS = ("gz", "zst")
+
+
+def find_input_file(filename: str) -> str:
+    candidates = [filename]
+    candidates.extend(
+        f"{filename}.{extension}" for extension in COMPRESSED_CSV_EXTENSIONS
+    )
+    existing_filenames = [
+        candidate for candidate in candidates if os.path.exists(candidate)
+    ]
+    if len(existing_filenames) > 1:
+        raise ValueError(
+            f"Found {', '.join(existing_filenames)}, "
+            "remove the stale ones or pass the input file explicitly"
+        )
+    return existing_filenames[0] if existing_filenames else filename
+
+
+@contextlib.contextmanager
+def open_input_file(filename: str, offset: int = 0) -> Iterator[TextIO]:
+    with open(filename, "rb") as file:
+        file.seek(offset)
+        if filename.endswith(".gz"):
+            reader = gzip.GzipFile(fileobj=file)
+        elif filename.endswith(".zst"):
+            import zstandard
+
+            reader = zstandard.ZstdDecompressor().stream_reader(
+                file, read_across_frames=True, closefd=False
+            )
+        else:
+            reader = file
+        with io.TextIOWrapper(reader) as text_file:
+            yield text_file
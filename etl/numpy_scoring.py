@@ -0,0 +1,201 @@
+import contextlib
+import gc
+import itertools
+import operator
+from typing import (
+    Callable,
+    Iterator,
+    Sequence,
+    Union
+)
+
+import numpy as np
+
+from date_codec import (
+    DATES_FILENAME,
+    load_date_lookup,
+    to_month_key,
+    to_ordinal
+)
+from input_files import (
+    find_input_file,
+    open_input_file
+)
+from scoring_common import (
+    CAUSES,
+    LOANS_COLUMNS,
+    LOANS_FILENAME,
+    MONTHLY_SPEND_COLUMNS,
+    MONTHLY_SPEND_FILENAME,
+    OUTPUT_FILE_PATH_PREFIX,
+    count_months_with_enough_money,
+    get_customer_month_keys,
+    write_output
+)
+
+AMOUNT_COLUMNS = (
+    "due_amount_in_usd",
+    "payment_amount_in_usd",
+    "available_money_in_usd",
+)
+
+Columns = dict[str, Union[np.ndarray, Sequence[str]]]
+
+
+@contextlib.contextmanager
+def paused_garbage_collection() -> Iterator[None]:
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def read_csv(filename: str, columns: tuple[str, ...]) -> Columns:
+    with open_input_file(find_input_file(filename)) as file:
+        header = [column.strip() for column in next(file).split(",")]
+        get_columns = operator.itemgetter(*map(header.index, columns))
+        with paused_garbage_collection():
+            rows = [
+                get_columns(row.rstrip("\n").split(",")) for row in file if row.strip()
+            ]
+            values = dict(zip(columns, zip(*rows)))
+            del rows
+    return {
+        column: (
+            np.fromiter(map(int, values.get(column, ())), np.int64)
+            if column in AMOUNT_COLUMNS
+            else values.get(column, ())
+        )
+        for column in columns
+    }
+
+
+def encode_values(values: Sequence[str], codes: dict[str, int]) -> np.ndarray:
+    return np.fromiter(
+        (codes.setdefault(value, len(codes)) for value in values), np.int64, len(values)
+    )
+
+
+def map_unique_values(values: Sequence[str], function: Callable[[str], int]) -> np.ndarray:
+    mapped_values = {value: function(value) for value in set(values)}
+    return np.fromiter(map(mapped_values.__getitem__, values), np.int64, len(values))
+
+
+def sum_per_customer(
+    customer_codes: np.ndarray, nr_of_customers: int, values: np.ndarray
+) -> np.ndarray:
+    sums = np.zeros(nr_of_customers, dtype=np.int64)
+    np.add.at(sums, customer_codes, values)
+    return sums
+
+
+def count_per_customer(
+    customer_codes: np.ndarray, nr_of_customers: int, condition: np.ndarray
+) -> np.ndarray:
+    return np.bincount(customer_codes[condition], minlength=nr_of_customers)
+
+
+def count_months_with_payment_lower_than_available_money(
+    customer_codes: dict[str, int],
+    loans_customer_codes: np.ndarray,
+    due_amounts: np.ndarray,
+    payment_amounts: np.ndarray,
+    month_keys: np.ndarray,
+    spend: Columns,
+) -> np.ndarray:
+    not_full_paid = payment_amounts < due_amounts
+    loans_keys, loans_codes = np.unique(
+        get_customer_month_keys(
+            loans_customer_codes[not_full_paid], month_keys[not_full_paid]
+        ),
+        return_inverse=True,
+    )
+    lowest_payment_in_month = np.full(len(loans_keys), np.iinfo(np.int64).max)
+    np.minimum.at(lowest_payment_in_month, loans_codes, payment_amounts[not_full_paid])
+
+    spend_customer_codes = map_unique_values(
+        spend["customer_id"], lambda customer: customer_codes.get(customer, -1)
+    )
+    spend_keys = get_customer_month_keys(
+        spend_customer_codes, map_unique_values(spend["month"], to_month_key)
+    )
+    return count_months_with_enough_money(
+        loans_keys,
+        lowest_payment_in_month,
+        spend_keys,
+        spend["available_money_in_usd"],
+        len(customer_codes),
+    )
+
+
+def count_points(loans: Columns, spend: Columns) -> tuple[list[str], np.ndarray]:
+    customer_codes: dict[str, int] = {}
+    loans_customer_codes = encode_values(loans["customer_id"], customer_codes)
+    nr_of_customers = len(customer_codes)
+    due_amounts = loans["due_amount_in_usd"]
+    payment_amounts = loans["payment_amount_in_usd"]
+    late_payments = map_unique_values(
+        loans["payment_date"], to_ordinal
+    ) > map_unique_values(loans["due_date"], to_ordinal)
+
+    balance_amounts = sum_per_customer(
+        loans_customer_codes, nr_of_customers, payment_amounts - due_amounts
+    )
+    skipped_payments = count_per_customer(
+        loans_customer_codes, nr_of_customers, payment_amounts == 0
+    )
+    not_full_paid_months = count_months_with_payment_lower_than_available_money(
+        customer_codes,
+        loans_customer_codes,
+        due_amounts,
+        payment_amounts,
+        map_unique_values(loans["due_date"], to_month_key),
+        spend,
+    )
+    points = np.column_stack(
+        (
+            (balance_amounts > 0) * 3,
+            (skipped_payments > 2) * 1,
+            count_per_customer(loans_customer_codes, nr_of_customers, late_payments),
+            not_full_paid_months // 3,
+        )
+    )
+    return list(customer_codes), points
+
+
+def summarize_output(customers: list[str], points: np.ndarray) -> list[str]:
+    totals = points.sum(axis=1)
+    has_points = totals > 0
+    rows = []
+    for customer, customer_points, total in zip(
+        itertools.compress(customers, has_points),
+        points[has_points].tolist(),
+        totals[has_points].tolist(),
+    ):
+        cause_points = "".join(
+            f"{cause}-{cause_points} "
+            for cause, cause_points in zip(CAUSES, customer_points)
+            if cause_points > 0
+        )
+        rows.append(f"{customer}, {cause_points}, {total}")
+    return rows
+
+
+def run_scoring(
+    loans_filename: str = LOANS_FILENAME,
+    monthly_spend_filename: str = MONTHLY_SPEND_FILENAME,
+    file_path_prefix: str = OUTPUT_FILE_PATH_PREFIX,
+    dates_filename: str = DATES_FILENAME,
+) -> str:
+    load_date_lookup(dates_filename)
+    loans = read_csv(loans_filename, LOANS_COLUMNS)
+    spend = read_csv(monthly_spend_filename, MONTHLY_SPEND_COLUMNS)
+    customers, points = count_points(loans, spend)
+    return write_output(summarize_output(customers, points), file_path_prefix)
+
+
+if __name__ == "__main__":
+    run_scoring()
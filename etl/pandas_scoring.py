@@ -0,0 +1,188 @@
+from typing import (
+    Any,
+    Callable,
+    Iterator,
+    Optional,
+    TextIO,
+    Union
+)
+
+import numpy as np
+import pandas as pd
+
+from date_codec import (
+    DATES_FILENAME,
+    load_date_lookup,
+    to_month_key,
+    to_ordinal
+)
+from input_files import find_input_file
+from scoring_common import (
+    CAUSES,
+    LOANS_COLUMNS,
+    LOANS_FILENAME,
+    MONTHLY_SPEND_COLUMNS,
+    MONTHLY_SPEND_FILENAME,
+    OUTPUT_FILE_PATH_PREFIX,
+    count_months_with_enough_money,
+    get_customer_month_keys,
+    write_output
+)
+
+ACCUMULATORS = (
+    "due_amount",
+    "paid_amount",
+    "skipped_payments",
+    "late_payments",
+    "not_full_paid_months",
+)
+
+
+def read_csv(
+    filename: Union[str, TextIO],
+    columns: tuple[str, ...],
+    customer_id_dtype: str = "str",
+    chunksize: Optional[int] = None,
+    header: Optional[list[str]] = None,
+) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    if isinstance(filename, str):
+        filename = find_input_file(filename)
+    return pd.read_csv(
+        filename,
+        header=None if header else "infer",
+        names=header,
+        usecols=columns,
+        dtype={
+            "customer_id": customer_id_dtype,
+            "due_date": "category",
+            "payment_date": "category",
+            "month": "category",
+        },
+        skipinitialspace=True,
+        chunksize=chunksize,
+    )
+
+
+def map_unique_values(
+    values: pd.Series, function: Callable[[pd.Index], Any]
+) -> np.ndarray:
+    codes, unique_values = pd.factorize(values)
+    return np.asarray(function(unique_values))[codes]
+
+
+def parse_dates(raw_dates: pd.Series) -> np.ndarray:
+    return map_unique_values(
+        raw_dates, lambda dates: np.array([to_ordinal(date) for date in dates])
+    )
+
+
+def get_month_keys(raw_dates: pd.Series) -> np.ndarray:
+    return map_unique_values(
+        raw_dates, lambda dates: np.array([to_month_key(date) for date in dates])
+    )
+
+
+def sum_loans_per_customer(loans_df: pd.DataFrame) -> pd.DataFrame:
+    late_payments = parse_dates(loans_df["payment_date"]) > parse_dates(
+        loans_df["due_date"]
+    )
+    loans_accumulators_df = pd.DataFrame(
+        {
+            "due_amount": loans_df["due_amount_in_usd"],
+            "paid_amount": loans_df["payment_amount_in_usd"],
+            "skipped_payments": loans_df["payment_amount_in_usd"] == 0,
+            "late_payments": late_payments,
+        }
+    )
+    return loans_accumulators_df.groupby(loans_df["customer_id"].to_numpy()).sum()
+
+
+def count_months_with_payment_lower_than_available_money(
+    loans_df: pd.DataFrame, spend_df: pd.DataFrame
+) -> pd.Series:
+    customer_codes, customers = pd.factorize(loans_df["customer_id"])
+
+    not_full_paid = (
+        loans_df["payment_amount_in_usd"] < loans_df["due_amount_in_usd"]
+    ).to_numpy()
+    lowest_payment_in_month = (
+        loans_df.loc[not_full_paid, "payment_amount_in_usd"]
+        .groupby(
+            get_customer_month_keys(
+                customer_codes[not_full_paid],
+                get_month_keys(loans_df["due_date"])[not_full_paid],
+            )
+        )
+        .min()
+    )
+
+    spend_keys = get_customer_month_keys(
+        map_unique_values(spend_df["customer_id"], customers.get_indexer),
+        get_month_keys(spend_df["month"]),
+    )
+    not_full_paid_months = count_months_with_enough_money(
+        lowest_payment_in_month.index.to_numpy(dtype=np.int64),
+        lowest_payment_in_month.to_numpy(),
+        spend_keys,
+        spend_df["available_money_in_usd"].to_numpy(),
+        len(customers),
+    )
+    return pd.Series(not_full_paid_months, index=customers)
+
+
+def count_accumulators(loans_df: pd.DataFrame, spend_df: pd.DataFrame) -> pd.DataFrame:
+    accumulators_df = sum_loans_per_customer(loans_df)
+    accumulators_df["not_full_paid_months"] = (
+        count_months_with_payment_lower_than_available_money(loans_df, spend_df)
+    )
+    return accumulators_df[list(ACCUMULATORS)].fillna(0).astype(np.int64)
+
+
+def count_points_from_accumulators(accumulators_df: pd.DataFrame) -> pd.DataFrame:
+    balance_amount = accumulators_df["paid_amount"] - accumulators_df["due_amount"]
+    points_df = pd.DataFrame(
+        {
+            "debtor": (balance_amount > 0) * 3,
+            "skipper": (accumulators_df["skipped_payments"] > 2) * 1,
+            "late payment": accumulators_df["late_payments"],
+            "not full paid": accumulators_df["not_full_paid_months"] // 3,
+        }
+    )
+    points_df["total"] = points_df[list(CAUSES)].sum(axis="columns")
+    return points_df
+
+
+def count_points(loans_df: pd.DataFrame, spend_df: pd.DataFrame) -> pd.DataFrame:
+    return count_points_from_accumulators(count_accumulators(loans_df, spend_df))
+
+
+def summarize_output(points_df: pd.DataFrame) -> pd.Series:
+    points_df = points_df.loc[points_df["total"] > 0].sort_index()
+    cause_points = pd.Series("", index=points_df.index)
+    for cause in CAUSES:
+        points = points_df[cause]
+        cause_points += np.where(points > 0, f"{cause}-" + points.astype(str) + " ", "")
+    return (
+        points_df.index.to_series()
+        + ", "
+        + cause_points
+        + ", "
+        + points_df["total"].astype(str)
+    )
+
+
+def run_scoring(
+    loans_filename: str = LOANS_FILENAME,
+    monthly_spend_filename: str = MONTHLY_SPEND_FILENAME,
+    file_path_prefix: str = OUTPUT_FILE_PATH_PREFIX,
+    dates_filename: str = DATES_FILENAME,
+) -> str:
+    load_date_lookup(dates_filename)
+    loans_df = read_csv(loans_filename, LOANS_COLUMNS)
+    spend_df = read_csv(monthly_spend_filename, MONTHLY_SPEND_COLUMNS, "category")
+    points_df = count_points(loans_df, spend_df)
+    return write_output(summarize_output(points_df), file_path_prefix)
+
+
+if __name__ == "__main__":
+    run_scoring()
@@ -0,0 +1,90 @@
+import argparse
+import itertools
+
+import numpy_scoring
+from date_codec import DATES_FILENAME
+from input_files import (
+    find_input_file,
+    open_input_file
+)
+from scoring_common import (
+    LOANS_FILENAME,
+    MONTHLY_SPEND_FILENAME,
+    OUTPUT_FILE_PATH_PREFIX
+)
+
+ENGINES = ("auto", "numpy", "beam")
+MAX_IN_MEMORY_ROWS = 5_000_000
+
+
+def count_rows(filename: str, limit: int) -> int:
+    with open_input_file(find_input_file(filename)) as file:
+        return max(sum(1 for _ in itertools.islice(file, limit + 2)) - 1, 0)
+
+
+def choose_engine(
+    loans_filename: str, monthly_spend_filename: str, max_in_memory_rows: int
+) -> str:
+    nr_of_rows = 0
+    for filename in (loans_filename, monthly_spend_filename):
+        nr_of_rows += count_rows(filename, max_in_memory_rows - nr_of_rows)
+        if nr_of_rows > max_in_memory_rows:
+            return "beam"
+    return "numpy"
+
+
+def run_scoring(
+    loans_filename: str = LOANS_FILENAME,
+    monthly_spend_filename: str = MONTHLY_SPEND_FILENAME,
+    file_path_prefix: str = OUTPUT_FILE_PATH_PREFIX,
+    dates_filename: str = DATES_FILENAME,
+    engine: str = "auto",
+    max_in_memory_rows: int = MAX_IN_MEMORY_ROWS,
+) -> str:
+    if engine == "auto":
+        engine = choose_engine(
+            loans_filename, monthly_spend_filename, max_in_memory_rows
+        )
+    if engine == "numpy":
+        numpy_scoring.run_scoring(
+            loans_filename, monthly_spend_filename, file_path_prefix, dates_filename
+        )
+    else:
+        import beam_pipeline
+
+        beam_pipeline.run_pipeline(
+            dates_filename=dates_filename,
+            loans_path=find_input_file(loans_filename),
+            monthly_spend_path=find_input_file(monthly_spend_filename),
+            output_path=file_path_prefix,
+        )
+    return engine
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--loans", type=str, default=LOANS_FILENAME)
+    parser.add_argument("--monthly-spend", type=str, default=MONTHLY_SPEND_FILENAME)
+    parser.add_argument("--dates", type=str, default=DATES_FILENAME)
+    parser.add_argument("--output", type=str, default=OUTPUT_FILE_PATH_PREFIX)
+    parser.add_argument("--engine", type=str, choices=ENGINES, default="auto")
+    parser.add_argument(
+        "--max-in-memory-rows",
+        type=int,
+        default=MAX_IN_MEMORY_ROWS,
+        help="Loans and monthly spend rows up to which the NumPy engine is used",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    engine = run_scoring(
+        args.loans,
+        args.monthly_spend,
+        args.output,
+        args.dates,
+        args.engine,
+        args.max_in_memory_rows,
+    )
+    print(f"Scored with the {engine} engine")
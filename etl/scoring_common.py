@@ -0,0 +1,57 @@
+from typing import Iterable
+
+import numpy as np
+
+HEADERS = ("customer_id", "cause-points", "total points")
+CAUSES = ("debtor", "skipper", "late payment", "not full paid")
+
+LOANS_FILENAME = "../data_generators/output/loans.csv"
+MONTHLY_SPEND_FILENAME = "../data_generators/output/monthly_spend.csv"
+OUTPUT_FILE_PATH_PREFIX = "outputs/final"
+
+LOANS_COLUMNS = (
+    "customer_id",
+    "due_amount_in_usd",
+    "due_date",
+    "payment_date",
+    "payment_amount_in_usd",
+)
+MONTHLY_SPEND_COLUMNS = ("customer_id", "available_money_in_usd", "month")
+MONTH_KEYS_OFFSET = np.int64(1_000_000)
+
+
+def get_customer_month_keys(
+    customer_codes: np.ndarray, month_keys: np.ndarray
+) -> np.ndarray:
+    return customer_codes * MONTH_KEYS_OFFSET + month_keys
+
+
+def count_months_with_enough_money(
+    loans_keys: np.ndarray,
+    lowest_payment_in_month: np.ndarray,
+    spend_keys: np.ndarray,
+    available_money: np.ndarray,
+    nr_of_customers: int,
+) -> np.ndarray:
+    matched_loans = np.searchsorted(loans_keys, spend_keys)
+    has_loan = matched_loans < len(loans_keys)
+    has_loan[has_loan] = loans_keys[matched_loans[has_loan]] == spend_keys[has_loan]
+    matched_loans, first_spend_in_month = np.unique(
+        matched_loans[has_loan], return_index=True
+    )
+    has_enough_money = (
+        lowest_payment_in_month[matched_loans]
+        < available_money[has_loan][first_spend_in_month]
+    )
+    return np.bincount(
+        loans_keys[matched_loans][has_enough_money] // MONTH_KEYS_OFFSET,
+        minlength=nr_of_customers,
+    )
+
+
+def write_output(rows: Iterable[str], file_path_prefix: str) -> str:
+    filename = f"{file_path_prefix}-00000-of-00001.csv"
+    with open(filename, "w") as file:
+        file.write(", ".join(HEADERS) + "\n")
+        file.writelines(row + "\n" for row in rows)
+    return filename